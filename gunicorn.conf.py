@@ -0,0 +1,101 @@
+import gc
+import glob
+import os
+import shutil
+import tempfile
+
+# The app is imported once in the master and the workers are forked from it, so the
+# interpreter, the libraries, the loaded frames, the filter indexes and the cubes are all
+# shared copy-on-write. The snapshot columns are memory-mapped read-only on top of that.
+# BLOCKBUSTER_PRELOAD=0 falls back to importing the app in every worker.
+preload_app = os.environ.get('BLOCKBUSTER_PRELOAD', '1') == '1'
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# BLOCKBUSTER_WORKER_CLASS picks how each worker serves concurrent requests:
+#   sync     one request at a time, a slow callback holds up the whole worker
+#   gthread  BLOCKBUSTER_THREADS requests at a time from a thread pool
+#   gevent   up to worker_connections requests at a time from greenlets
+#   asgi     uvicorn serving the ASGI wrapper, start it with `asgi:app` instead of `app:server`
+#
+# `python src/throughput.py 400 16` on the bundled data, 2 workers on a single CPU:
+#
+#      mode   req/s     p50     p95   layout p95
+#      sync    14.5  1080 ms  1197 ms   1185 ms
+#   gthread    13.2  1171 ms  1877 ms    887 ms
+#    gevent    14.7  1076 ms  1200 ms   1168 ms
+#      asgi    15.0  1020 ms  1704 ms    998 ms
+#
+# The callbacks are CPU bound, so throughput stays with the number of cores whatever the mode,
+# and sync, the default, has the best callback p95. The other modes are opt-in: the threaded ones
+# let cheap requests through while slow callbacks run, which is what a user waiting on a page load
+# sees ('layout p95'), at the cost of slower callbacks; gevent cannot switch inside pandas code.
+WORKER_CLASSES = {'sync': 'sync', 'gthread': 'gthread', 'gevent': 'gevent', 'asgi': 'uvicorn_worker.UvicornWorker'}
+mode = os.environ.get('BLOCKBUSTER_WORKER_CLASS', 'sync')
+worker_class = WORKER_CLASSES[mode]
+# gunicorn turns sync workers into gthread ones as soon as threads > 1
+threads = int(os.environ.get('BLOCKBUSTER_THREADS', 8)) if mode == 'gthread' else 1
+worker_connections = int(os.environ.get('BLOCKBUSTER_WORKER_CONNECTIONS', 100))
+
+if mode == 'gevent':
+    # The preloaded app has to see the patched socket and threading modules too
+    from gevent import monkey
+    monkey.patch_all()
+
+# Memory of the master plus its workers, measured with `python src/worker_memory.py 1 4 16`
+# on the bundled data (BLOCKBUSTER_COMPACT=1, after each worker served a few page loads):
+#
+#   workers   preload PSS   private   no preload PSS   private
+#         1       124 MiB    47 MiB          124 MiB   114 MiB
+#         4       157 MiB    77 MiB          363 MiB   329 MiB
+#        16       284 MiB   204 MiB         1308 MiB  1273 MiB
+#
+# With preload each extra worker costs about 11 MiB, against about 80 MiB without.
+
+# Every worker writes its metrics to its own files here and /metrics adds them up (src/metrics.py).
+# This file is read by the master before the app is loaded and the workers are forked, so they all
+# inherit a directory of this server's own, removed when it stops. A PROMETHEUS_MULTIPROC_DIR set
+# beforehand is used instead, with the counts of a previous run cleared.
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    metrics_dir, own_metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR'], False
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+else:
+    metrics_dir, own_metrics_dir = tempfile.mkdtemp(prefix='blockbuster-metrics-'), True
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+
+if preload_app:
+    # The collector would otherwise write to the header of every object it scans, which
+    # unshares the pages holding them; frozen objects are never scanned again
+    gc.disable()
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before the first worker is forked
+    if preload_app:
+        # Importing metrics created the master's file for the per-worker RSS gauge, at 0
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
+        # app.py imports these on first use, which would be once per worker after the fork
+        import plotly.express
+        import plotly.subplots
+        gc.freeze()
+        gc.enable()
+
+
+def post_fork(server, worker):
+    # Reports the memory of a preloaded worker before its first request; the master never
+    # sets the gauge, so it does not show up as a worker
+    if preload_app:
+        import metrics
+        metrics.worker_rss.set(metrics.rss())
+
+
+def child_exit(server, worker):
+    # Drops the per-worker gauges (RSS) of a worker that exited
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if own_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -1,12 +1,26 @@
-import dash
-from dash import Dash, dcc, html, dash_table, callback
-from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
-from dash.dash_table.Format import Format, Symbol, Scheme
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import pandas as pd
-import plotly.express as px
+import logging
+import os
+
+from startup import phase, report
+
+logging.basicConfig(level=os.environ.get('BLOCKBUSTER_LOG_LEVEL', 'INFO'))
+logger = logging.getLogger(__name__)
+
+with phase('imports'):
+    from dash import Dash, ctx, dcc, html
+    from dash.dependencies import ClientsideFunction, Input, Output
+    from dash.dash_table.Format import Format, Symbol, Scheme
+    import plotly.graph_objects as go
+    import pandas as pd
+    from flask import Response, request
+
+from utils import filter_query_mask, lazy_import
+from data import AGE_EDGES, age_buckets, facts, memory_report
+
+# Only a few figures need these, so they are imported on first use; gunicorn.conf.py imports
+# them before forking the workers when the app is preloaded
+px = lazy_import('plotly.express')
+subplots = lazy_import('plotly.subplots')
 
 import pages.ranking as rk
 import pages.evolution as evo
@@ -17,14 +31,80 @@ import pages.inclusivity as inclusivity
 import pages.age as age
 import pages.geo as geo
 
-from data import tables
+from filters import SORT_COLUMNS, filter_frame, indexes, sort_indexes
+from cache import memoize, memoize_figure
+from figures import patch_on
+from coalesce import active_filters
+import metrics
+import profiling
+import timing
+from cube import cubes
+import background
 
 
 
-app = Dash(__name__)
+app = Dash(__name__, background_callback_manager=background.manager)
 server = app.server
 
 
+@server.before_request
+def start_timing():
+    if request.path.endswith('/_dash-update-component'):
+        timing.start()
+
+
+if profiling.ENABLED:
+    # Registered only with a token set, so requests pay nothing for it otherwise
+    @server.before_request
+    def start_profile():
+        mode = profiling.requested(request)
+        if mode is not None:
+            profiling.start(mode)
+
+    @server.after_request
+    def finish_profile(response):
+        body = request.get_json(silent=True) or {}
+        name = profiling.finish(response, timing.output_id(body['output']) if body.get('output') else None, body.get('inputs', []))
+        if name is not None:
+            response.headers['X-Blockbuster-Profile-File'] = name
+        return response
+
+
+@server.route('/metrics')
+def serve_metrics():
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
+
+
+@server.route('/timings')
+def serve_timings():
+    # p50/p95 of each phase over the last requests of each output, for this worker only
+    return Response(timing.timing_report() + '\n', content_type='text/plain')
+
+
+@server.after_request
+def measure_payload(response):
+    # Bytes sent back per callback, in /metrics as blockbuster_callback_response_bytes
+    if request.path.endswith('/_dash-update-component') and response.status_code == 200:
+        output = (request.get_json(silent=True) or {}).get('output')
+        if output:
+            size = response.calculate_content_length() or len(response.get_data())
+            metrics.record_payload(timing.output_id(output), size)
+            logger.debug('%s: %d bytes', output, size)
+    return response
+
+
+@server.after_request
+def add_server_timing(response):
+    # Per-phase timings of the callback, see timing.timing_report(), also counted in /metrics;
+    # registered last so that it runs first, as soon as Dash has built the response
+    output = (request.get_json(silent=True) or {}).get('output')
+    timings = timing.finish(response, output)
+    if timings is not None and output:
+        metrics.record_callback(timing.output_id(output), response.status_code, timings)
+    return response
+
+
 tabs_styles = {
     'height': '44px'
 }
@@ -66,53 +146,57 @@ app.layout = html.Div(
     ],
 )
 
+for tab in ['ranking', 'evolution', 'actor', 'director', 'studio', 'inclusivity', 'ages', 'geo']:
+    # A burst of filter changes reaches the server callbacks of a tab as one update (see assets/clientside.js)
+    app.clientside_callback(
+        ClientsideFunction(namespace="blockbuster", function_name="debounceFilters"),
+        Output(component_id=f"filters-{tab}", component_property="data"),
+        Input(component_id=f"language-select-{tab}", component_property="value"),
+        Input(component_id=f"director-select-{tab}", component_property="value"),
+        Input(component_id=f"studio-select-{tab}", component_property="value"),
+        Input(component_id=f"country-select-{tab}", component_property="value"),
+        Input(component_id=f"date-select-{tab}", component_property="start_date"),
+        Input(component_id=f"date-select-{tab}", component_property="end_date")
+    )
+
+logger.info(report())
+logger.info(memory_report())
+
+
+
+@memoize('success-data')
+def success_data(entity, metric2, language, director, studio, country, start_date, end_date):
+    return cubes[entity].query(metric2, language, director, studio, country, start_date, end_date)
 
 
 @app.callback(
     Output(component_id="actor-plot", component_property="figure"),
     Input(component_id="metric-select-actor", component_property="value"),
     Input(component_id="metric-select-actor-2", component_property="value"),
-    Input(component_id="language-select-actor", component_property="value"),
-    Input(component_id="director-select-actor", component_property="value"),
-    Input(component_id="studio-select-actor", component_property="value"),
-    Input(component_id="country-select-actor", component_property="value"),
-    Input(component_id="date-select-actor", component_property="start_date"),
-    Input(component_id="date-select-actor", component_property="end_date")
+    Input(component_id="top-select-actor", component_property="value"),
+    Input(component_id="filters-actor", component_property="data")
 )
-def update_table(metric,metric2, language, director, studio, country, start_date, end_date):
-
-    df = tables['Actor'].merge(tables['Cast'], left_index=True, right_on='CastActorID').merge(tables['Film'], left_on='CastFilmID', right_index=True)
+@timing.mark_return
+@patch_on("metric-select-actor", "metric-select-actor-2", "top-select-actor")
+def actor_plot(metric, metric2, top, filters):
+    return actor_figure(metric, metric2, top, *active_filters(filters))
 
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
+@memoize_figure('actor-plot')
+def actor_figure(metric,metric2, top, language, director, studio, country, start_date, end_date):
 
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
-
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
+    # Only the top bars are drawn, so a partial selection replaces the full sort
+    data = success_data('Actor', metric2, language, director, studio, country, start_date, end_date).nlargest(top or 10, f"Film{metric}")
     
-    if metric2 == "Average":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits', 'ActorName']].groupby('ActorName').mean().sort_values(f"Film{metric}", ascending=False)
-    elif metric2 == "Total":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits', 'ActorName']].groupby('ActorName').sum().sort_values(f"Film{metric}", ascending=False)
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
 
-    data = data.merge(df[['FilmName','ActorName']].groupby('ActorName').count(),left_index=True,right_index=True)
-    
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(x=data.index, y=data[f"Film{metric}"],name=metric,offsetgroup=1), secondary_y=False)
 
-    fig.add_trace(go.Bar(x=data.index, y=data[f"Film{metric}"].iloc[0:10],name=metric,offsetgroup=1), secondary_y=False)
-
-    fig.add_trace(go.Bar(x=data.index, y=data[f"FilmName"].iloc[0:10],name='Number of Films',offsetgroup=2), secondary_y=True)
+    fig.add_trace(go.Bar(x=data.index, y=data[f"FilmName"],name='Number of Films',offsetgroup=2), secondary_y=True)
 
     fig.update_yaxes(tickprefix="$ ", ticksuffix="M ", secondary_y=False)
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Ranking of Actors with the best {metric} {metric2}",   
+    fig.update_layout(title_text=f"Ranking of Actors with the best {metric} {metric2}",   
     barmode='group',
     bargap=0.15, # gap between bars of adjacent location coordinates.
     bargroupgap=0.1 # gap between bars of the same location coordinate.
@@ -124,47 +208,30 @@ def update_table(metric,metric2, language, director, studio, country, start_date
     Output(component_id="director-plot", component_property="figure"),
     Input(component_id="metric-select-director", component_property="value"),
     Input(component_id="metric-select-director-2", component_property="value"),
-    Input(component_id="language-select-director", component_property="value"),
-    Input(component_id="director-select-director", component_property="value"),
-    Input(component_id="studio-select-director", component_property="value"),
-    Input(component_id="country-select-director", component_property="value"),
-    Input(component_id="date-select-director", component_property="start_date"),
-    Input(component_id="date-select-director", component_property="end_date")
+    Input(component_id="top-select-director", component_property="value"),
+    Input(component_id="filters-director", component_property="data")
 )
-def update_table(metric,metric2, language, director, studio, country, start_date, end_date):
-
-    df = tables['Director'].merge(tables['Film'], right_on='FilmDirectorID', left_index=True)
-
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
+@timing.mark_return
+@patch_on("metric-select-director", "metric-select-director-2", "top-select-director")
+def director_plot(metric, metric2, top, filters):
+    return director_figure(metric, metric2, top, *active_filters(filters))
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
 
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
+@memoize_figure('director-plot')
+def director_figure(metric,metric2, top, language, director, studio, country, start_date, end_date):
 
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
-
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
+    # Only the top bars are drawn, so a partial selection replaces the full sort
+    data = success_data('Director', metric2, language, director, studio, country, start_date, end_date).nlargest(top or 10, f"Film{metric}")
     
-    if metric2 == "Average":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits', 'DirectorName']].groupby('DirectorName').mean().sort_values(f"Film{metric}", ascending=False)
-    elif metric2 == "Total":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits', 'DirectorName']].groupby('DirectorName').sum().sort_values(f"Film{metric}", ascending=False)
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
 
-    data = data.merge(df[['FilmName','DirectorName']].groupby('DirectorName').count(),left_index=True,right_index=True)
-    
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(x=data.index, y=data[f"Film{metric}"],name=metric,offsetgroup=1), secondary_y=False)
 
-    fig.add_trace(go.Bar(x=data.index, y=data[f"Film{metric}"].iloc[0:10],name=metric,offsetgroup=1), secondary_y=False)
-
-    fig.add_trace(go.Bar(x=data.index, y=data[f"FilmName"].iloc[0:10],name='Number of Films',offsetgroup=2), secondary_y=True)
+    fig.add_trace(go.Bar(x=data.index, y=data[f"FilmName"],name='Number of Films',offsetgroup=2), secondary_y=True)
 
     fig.update_yaxes(tickprefix="$ ", ticksuffix="M ", secondary_y=False)
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Ranking of Directors with the best {metric} {metric2}",   
+    fig.update_layout(title_text=f"Ranking of Directors with the best {metric} {metric2}",   
     barmode='group',
     bargap=0.15, # gap between bars of adjacent location coordinates.
     bargroupgap=0.1 # gap between bars of the same location coordinate.
@@ -172,42 +239,49 @@ def update_table(metric,metric2, language, director, studio, country, start_date
 
     return fig
 
-@app.callback(
-    Output(component_id="evolution-plot", component_property="figure"),
-    Input(component_id="metric-select-evolution", component_property="value"),
-    Input(component_id="language-select-evolution", component_property="value"),
-    Input(component_id="director-select-evolution", component_property="value"),
-    Input(component_id="studio-select-evolution", component_property="value"),
-    Input(component_id="country-select-evolution", component_property="value"),
-    Input(component_id="date-select-evolution", component_property="start_date"),
-    Input(component_id="date-select-evolution", component_property="end_date")
-)
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    
-    df = tables["Film"]
-
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
-
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
-
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
+@memoize('evolution-data')
+def evolution_data(metric, language, director, studio, country, start_date, end_date):
 
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
+    df = filter_frame('Film', language, director, studio, country, start_date, end_date)
 
     if metric == "Average":
         data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits','FilmReleaseYear']].groupby('FilmReleaseYear').mean()
     if metric == "Total":
         data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits','FilmReleaseYear']].groupby('FilmReleaseYear').sum()
+
+    return data.merge(df[['FilmName','FilmReleaseYear']].groupby('FilmReleaseYear').count(), left_index=True, right_index=True)
+
+
+@app.callback(
+    Output(component_id="evolution-store", component_property="data"),
+    Input(component_id="filters-evolution", component_property="data")
+)
+@timing.mark_return
+def evolution_series(filters):
+    # Both metrics are sent at once, the browser swaps between them (see assets/clientside.js)
+    filters = active_filters(filters)
+    figures = {metric: evolution_figure(metric, *filters) for metric in ['Average', 'Total']}
+    return {
+        'figure': figures['Average'],
+        'series': {metric: [trace['y'] for trace in figure['data']] for metric, figure in figures.items()},
+        'titles': {metric: figure['layout']['title'] for metric, figure in figures.items()},
+    }
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="blockbuster", function_name="evolutionFigure"),
+    Output(component_id="evolution-plot", component_property="figure"),
+    Input(component_id="metric-select-evolution", component_property="value"),
+    Input(component_id="evolution-store", component_property="data")
+)
+
+
+@memoize_figure('evolution-plot')
+def evolution_figure(metric, language, director, studio, country, start_date, end_date):
     
-    data = data.merge(df[['FilmName','FilmReleaseYear']].groupby('FilmReleaseYear').count(), left_index=True, right_index=True)
+    data = evolution_data(metric, language, director, studio, country, start_date, end_date)
 
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
 
     for i in ['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits']:
         fig.add_trace(go.Scatter(y=data[i], x=data.index, name=i), secondary_y=False)
@@ -216,7 +290,7 @@ def update_table(metric, language, director, studio, country, start_date, end_da
 
     fig.update_yaxes(tickprefix="$ ", ticksuffix="M ", secondary_y=False)
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Global Box Offices/Budgets/Benefits {metric}")
+    fig.update_layout(title_text=f"Global Box Offices/Budgets/Benefits {metric}")
 
     return fig
 
@@ -224,47 +298,30 @@ def update_table(metric, language, director, studio, country, start_date, end_da
     Output(component_id="studio-plot", component_property="figure"),
     Input(component_id="metric-select-studio", component_property="value"),
     Input(component_id="metric-select-studio-2", component_property="value"),
-    Input(component_id="language-select-studio", component_property="value"),
-    Input(component_id="director-select-studio", component_property="value"),
-    Input(component_id="studio-select-studio", component_property="value"),
-    Input(component_id="country-select-studio", component_property="value"),
-    Input(component_id="date-select-studio", component_property="start_date"),
-    Input(component_id="date-select-studio", component_property="end_date")
+    Input(component_id="top-select-studio", component_property="value"),
+    Input(component_id="filters-studio", component_property="data")
 )
-def update_table(metric,metric2, language, director, studio, country, start_date, end_date):
-
-    df = tables['Studio'].merge(tables['Film'], right_on='FilmStudioID', left_index=True)
+@timing.mark_return
+@patch_on("metric-select-studio", "metric-select-studio-2", "top-select-studio")
+def studio_plot(metric, metric2, top, filters):
+    return studio_figure(metric, metric2, top, *active_filters(filters))
 
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
+@memoize_figure('studio-plot')
+def studio_figure(metric,metric2, top, language, director, studio, country, start_date, end_date):
 
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
-
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
+    # Only the top bars are drawn, so a partial selection replaces the full sort
+    data = success_data('Studio', metric2, language, director, studio, country, start_date, end_date).nlargest(top or 10, f"Film{metric}")
     
-    if metric2 == "Average":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits', 'StudioName']].groupby('StudioName').mean().sort_values(f"Film{metric}", ascending=False)
-    elif metric2 == "Total":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits', 'StudioName']].groupby('StudioName').sum().sort_values(f"Film{metric}", ascending=False)
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
 
-    data = data.merge(df[['FilmName','StudioName']].groupby('StudioName').count(),left_index=True,right_index=True)
-    
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(x=data.index, y=data[f"Film{metric}"],name=metric,offsetgroup=1), secondary_y=False)
 
-    fig.add_trace(go.Bar(x=data.index, y=data[f"Film{metric}"].iloc[0:10],name=metric,offsetgroup=1), secondary_y=False)
-
-    fig.add_trace(go.Bar(x=data.index, y=data[f"FilmName"].iloc[0:10],name='Number of Films',offsetgroup=2), secondary_y=True)
+    fig.add_trace(go.Bar(x=data.index, y=data[f"FilmName"],name='Number of Films',offsetgroup=2), secondary_y=True)
 
     fig.update_yaxes(tickprefix="$ ", ticksuffix="M ", secondary_y=False)
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Ranking of Studios with the best {metric} {metric2}",   
+    fig.update_layout(title_text=f"Ranking of Studios with the best {metric} {metric2}",   
     barmode='group',
     bargap=0.15, # gap between bars of adjacent location coordinates.
     bargroupgap=0.1 # gap between bars of the same location coordinate.
@@ -274,127 +331,70 @@ def update_table(metric,metric2, language, director, studio, country, start_date
 
 @app.callback(
     Output(component_id="inclusivity-plot-1", component_property="figure"),
+    Output(component_id="inclusivity-plot-2", component_property="figure"),
+    Output(component_id="inclusivity-plot-3", component_property="figure"),
     Input(component_id="metric-select-inclusivity", component_property="value"),
-    Input(component_id="language-select-inclusivity", component_property="value"),
-    Input(component_id="director-select-inclusivity", component_property="value"),
-    Input(component_id="studio-select-inclusivity", component_property="value"),
-    Input(component_id="country-select-inclusivity", component_property="value"),
-    Input(component_id="date-select-inclusivity", component_property="start_date"),
-    Input(component_id="date-select-inclusivity", component_property="end_date")
+    Input(component_id="filters-inclusivity", component_property="data"),
+    **background.options('inclusivity')
 )
-def update_table(metric, language, director, studio, country, start_date, end_date):
+@timing.mark_return
+@background.progressive
+def inclusivity_figures(set_progress, metric, filters):
+    args = (metric, *active_filters(filters))
+    figures = []
+    for figure in [inclusivity_figure_1, inclusivity_figure_2, inclusivity_figure_3]:
+        set_progress((len(figures), 3))
+        figures.append(figure(*args))
+    return tuple(figures)
+
+
+@memoize('inclusivity-data')
+def inclusivity_data(metric, language, director, studio, country, start_date, end_date):
+    # Filtered once for the three figures of the tab
+    df = filter_frame(metric, language, director, studio, country, start_date, end_date)
+    df = df[['FilmName', 'FilmReleaseYear', f'{metric}Name', f'{metric}Gender', 'FilmBoxOfficeDollars', 'FilmBudgetDollars']].assign(Male=df[f'{metric}Gender'] == 'Male')
+
+    data = {}
+    for key in ['FilmName', 'FilmReleaseYear']:
+        data[key] = df.groupby(key, observed=True).agg(**{f'{metric}Name': (f'{metric}Name', 'count'), 'Male': ('Male', 'sum')})
+        data[key]['Percent_Male'] = data[key]['Male']/data[key][f'{metric}Name']
+    data['Gender'] = df[[f'{metric}Gender','FilmBoxOfficeDollars','FilmBudgetDollars']].groupby(f'{metric}Gender', observed=True).mean()
+
+    return data
+
+
+@memoize_figure('inclusivity-plot-1')
+def inclusivity_figure_1(metric, language, director, studio, country, start_date, end_date):
     
-    if metric == "Actor":
-        df = tables[metric][[f'{metric}Name',f'{metric}Gender']].merge(tables['Cast'][[f'Cast{metric}ID','CastFilmID']], left_index=True, right_on=f'Cast{metric}ID').merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID']], left_on='CastFilmID', right_index=True)
-    elif metric == "Director":
-        df = tables[metric][[f'{metric}Name',f'{metric}Gender']].merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID']], left_index=True, right_on=f'Film{metric}ID')
-
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
-
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
-
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
-
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
-
-    df['Male'] = pd.get_dummies(df[f'{metric}Gender'])['Male']
-
-    data = df[['FilmName',f'{metric}Name']].groupby('FilmName').count().merge(df[['Male','FilmName']].groupby('FilmName').sum(),left_index=True,right_index=True)[[f'{metric}Name','Male']]
-    data['Percent_Male'] = data['Male']/data[f'{metric}Name']
+    data = inclusivity_data(metric, language, director, studio, country, start_date, end_date)['FilmName']
     fig = px.histogram(data['Percent_Male'])
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Repartition of pourcentage of men in the main character")
+    fig.update_layout(title_text=f"Repartition of pourcentage of men in the main character")
 
     return fig
-    
-@app.callback(
-    Output(component_id="inclusivity-plot-2", component_property="figure"),
-    Input(component_id="metric-select-inclusivity", component_property="value"),
-    Input(component_id="language-select-inclusivity", component_property="value"),
-    Input(component_id="director-select-inclusivity", component_property="value"),
-    Input(component_id="studio-select-inclusivity", component_property="value"),
-    Input(component_id="country-select-inclusivity", component_property="value"),
-    Input(component_id="date-select-inclusivity", component_property="start_date"),
-    Input(component_id="date-select-inclusivity", component_property="end_date")
-)
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    
-    if metric == "Actor":
-        df = tables[metric][[f'{metric}Name',f'{metric}Gender']].merge(tables['Cast'][[f'Cast{metric}ID','CastFilmID']], left_index=True, right_on=f'Cast{metric}ID').merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_on='CastFilmID', right_index=True)
-    elif metric == "Director":
-        df = tables[metric][[f'{metric}Name',f'{metric}Gender']].merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_index=True, right_on=f'Film{metric}ID')
-
-
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
 
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
-
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
-
-    df['Male'] = pd.get_dummies(df[f'{metric}Gender'])['Male']
-
-    data = df[['FilmReleaseYear',f'{metric}Name']].groupby('FilmReleaseYear').count().merge(df[['Male','FilmReleaseYear']].groupby('FilmReleaseYear').sum(),left_index=True,right_index=True)[[f'{metric}Name','Male']]
-    data['Percent_Male'] = data['Male']/data[f'{metric}Name']
+@memoize_figure('inclusivity-plot-2')
+def inclusivity_figure_2(metric, language, director, studio, country, start_date, end_date):
+    
+    data = inclusivity_data(metric, language, director, studio, country, start_date, end_date)['FilmReleaseYear']
     
     fig = go.Figure()
     fig.add_bar(x=data.index,y=data['Percent_Male'], name="% of Male")
     fig.add_bar(x=data.index,y=1-data['Percent_Male'], name="% of Female")
     fig.update_layout(barmode="relative")
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Repartition of pourcentage of men in the main character by year")
+    fig.update_layout(title_text=f"Repartition of pourcentage of men in the main character by year")
 
     return fig
-    
-    
-@app.callback(
-    Output(component_id="inclusivity-plot-3", component_property="figure"),
-    Input(component_id="metric-select-inclusivity", component_property="value"),
-    Input(component_id="language-select-inclusivity", component_property="value"),
-    Input(component_id="director-select-inclusivity", component_property="value"),
-    Input(component_id="studio-select-inclusivity", component_property="value"),
-    Input(component_id="country-select-inclusivity", component_property="value"),
-    Input(component_id="date-select-inclusivity", component_property="start_date"),
-    Input(component_id="date-select-inclusivity", component_property="end_date")
-)
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    
-    if metric == "Actor":
-        df = tables[metric][[f'{metric}Name',f'{metric}Gender']].merge(tables['Cast'][[f'Cast{metric}ID','CastFilmID']], left_index=True, right_on=f'Cast{metric}ID').merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID']], left_on='CastFilmID', right_index=True)
-    elif metric == "Director":
-        df = tables[metric][[f'{metric}Name',f'{metric}Gender']].merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID']], left_index=True, right_on=f'Film{metric}ID')
-
-
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
-
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
-
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
 
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
 
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
-
-    data= df[[f'{metric}Gender','FilmBoxOfficeDollars','FilmBudgetDollars']].groupby(f'{metric}Gender').mean()
+@memoize_figure('inclusivity-plot-3')
+def inclusivity_figure_3(metric, language, director, studio, country, start_date, end_date):
+    
+    data = inclusivity_data(metric, language, director, studio, country, start_date, end_date)['Gender']
 
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
 
     fig.add_trace(go.Bar(x=data.index, y=data[f"FilmBoxOfficeDollars"],offsetgroup=1,name="BoxOffice Dollars" ), secondary_y=False)
 
@@ -402,7 +402,7 @@ def update_table(metric, language, director, studio, country, start_date, end_da
 
     fig.update_yaxes(tickprefix="$ ", ticksuffix="M ", secondary_y=False)
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Difference between Female and Male",   
+    fig.update_layout(title_text=f"Difference between Female and Male",   
     barmode='group',
     bargap=0.15, # gap between bars of adjacent location coordinates.
     bargroupgap=0.1 # gap between bars of the same location coordinate.
@@ -412,275 +412,191 @@ def update_table(metric, language, director, studio, country, start_date, end_da
     return fig
 
 
-@app.callback(
-    Output(component_id="ranking-container", component_property="children"),
-    Input(component_id="metric-select", component_property="value"),
-    Input(component_id="language-select-ranking", component_property="value"),
-    Input(component_id="director-select-ranking", component_property="value"),
-    Input(component_id="studio-select-ranking", component_property="value"),
-    Input(component_id="country-select-ranking", component_property="value"),
-    Input(component_id="date-select-ranking", component_property="start_date"),
-    Input(component_id="date-select-ranking", component_property="end_date")
-)
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    df = tables["Film"]
+@memoize('ranking-films')
+def ranking_films(language, director, studio, country, start_date, end_date):
+    # Positions in facts['Film'] of the filtered films, shared by the ranking table and figure
+    return indexes['Film'].select(language, director, studio, country, start_date, end_date)
 
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
-
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
-
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
+@app.callback(
+    Output(component_id="ranking-store", component_property="data"),
+    Input(component_id="filters-ranking", component_property="data")
+)
+@timing.mark_return
+def ranking_selection(filters):
+    # The store only holds the filters, a handle to the cached selection, so the rows never go through the browser
+    filters = active_filters(filters)
+    return {'filters': filters, 'count': len(ranking_films(*filters))}
 
-    df = df.sort_values(f"Film{metric}", ascending=False)
 
+def ranking_columns(metric):
     if metric in ['BoxOfficeDollars', 'BudgetDollars','Benefits'] :
         format_metric = Format(precision=4, scheme=Scheme.decimal).symbol(Symbol.yes).symbol_prefix('$').symbol_suffix(' M')
     else : 
         format_metric = Format(precision=2, scheme=Scheme.decimal_integer)
 
-    return dash_table.DataTable(
-        id="procedure-stats-table",
-        columns=[{'name': 'FilmName', 'id': 'FilmName'}, {'name': f"Film{metric}", 'id': f"Film{metric}",'type':'numeric','format':format_metric}],
-        data=df.to_dict("records"),
-        filter_action="native",
-        sort_action="native",
-        style_cell={
-            "textOverflow": "ellipsis",
-            "background-color": "#242a3b",
-            "color": "#7b7d8d",
-        },
-        sort_mode="multi",
-        page_size=10,
-        style_header={"background-color": "#1f2536"},
-        page_current=0
-        
-    )
+    return [{'name': 'FilmName', 'id': 'FilmName'}, {'name': f"Film{metric}", 'id': f"Film{metric}",'type':'numeric','format':format_metric}]
 
 
-@app.callback(
-    Output(component_id="figure-ranking", component_property="figure"),
-    Input(component_id="metric-select", component_property="value"),
-    Input(component_id="language-select-ranking", component_property="value"),
-    Input(component_id="director-select-ranking", component_property="value"),
-    Input(component_id="studio-select-ranking", component_property="value"),
-    Input(component_id="country-select-ranking", component_property="value"),
-    Input(component_id="date-select-ranking", component_property="start_date"),
-    Input(component_id="date-select-ranking", component_property="end_date"),
-    Input(component_id="ranking-container", component_property="children")
-)
+@memoize('ranking-rows')
+def ranking_rows(metric, sort_by, filter_query, language, director, studio, country, start_date, end_date):
+    # Positions in facts['Film'] of the filtered films, in table order
+    positions = ranking_films(language, director, studio, country, start_date, end_date)
+    if filter_query:
+        films = facts['Film'].take(positions)
+        positions = positions[filter_query_mask(films[['FilmName', f"Film{metric}"]], filter_query)]
 
-def ranking_figure(metric, language, director, studio, country, start_date, end_date, page_count):
-    df = tables["Film"]
+    sort_by = [(column['column_id'], column['direction'] == 'asc') for column in sort_by or []] or [(f"Film{metric}", False)]
+    if len(sort_by) == 1 and sort_by[0][0] in SORT_COLUMNS:
+        return sort_indexes['Film'].sort(positions, *sort_by[0])
 
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
+    films = facts['Film'].take(positions).reset_index(drop=True)
+    order = films.sort_values([column for column, _ in sort_by], ascending=[ascending for _, ascending in sort_by], kind='stable').index
+    return positions[order]
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
 
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
+@app.callback(
+    Output(component_id="procedure-stats-table", component_property="data"),
+    Output(component_id="procedure-stats-table", component_property="columns"),
+    Output(component_id="procedure-stats-table", component_property="page_count"),
+    Output(component_id="procedure-stats-table", component_property="page_current"),
+    Input(component_id="metric-select", component_property="value"),
+    Input(component_id="ranking-store", component_property="data"),
+    Input(component_id="procedure-stats-table", component_property="page_current"),
+    Input(component_id="procedure-stats-table", component_property="page_size"),
+    Input(component_id="procedure-stats-table", component_property="sort_by"),
+    Input(component_id="procedure-stats-table", component_property="filter_query")
+)
+@timing.mark_return
+def ranking_table(metric, selection, page_current, page_size, sort_by, filter_query):
+    # Only the rows of the current page are sent; any other change starts again from the first page
+    if ctx.triggered_id != "procedure-stats-table":
+        page_current = 0
+    positions = ranking_rows(metric, sort_by, filter_query, *selection['filters'])
+    page_count = max(1, -(-len(positions) // page_size))
+    page_current = min(page_current, page_count - 1)
+    page = positions[page_current * page_size:(page_current + 1) * page_size]
+    data = facts['Film'].take(page)[['FilmName', f"Film{metric}"]].to_dict("records")
 
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
+    return data, ranking_columns(metric), page_count, page_current
 
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
 
-    df = df[['FilmName',f"Film{metric}"]].sort_values(f"Film{metric}", ascending=False)
+@app.callback(
+    Output(component_id="figure-ranking", component_property="figure"),
+    Input(component_id="metric-select", component_property="value"),
+    Input(component_id="top-select-ranking", component_property="value"),
+    Input(component_id="ranking-store", component_property="data")
+)
+@timing.mark_return
+@patch_on("metric-select", "top-select-ranking")
+def ranking_figure(metric, top, selection):
+    return ranking_bars(metric, top, *selection['filters'])
 
-    page_count = page_count['props']['page_current']
 
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+@memoize_figure('figure-ranking')
+def ranking_bars(metric, top, language, director, studio, country, start_date, end_date):
+    positions = sort_indexes['Film'].sort(ranking_films(language, director, studio, country, start_date, end_date), f"Film{metric}", ascending=False)
+    df = facts['Film'].take(positions[:top or 10])
+    df = df[df[f"Film{metric}"].notna()]
 
-    fig.add_trace(go.Bar(x=df['FilmName'], y=df[f"Film{metric}"].iloc[0:10]))
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7')
+    fig.add_trace(go.Bar(x=df['FilmName'], y=df[f"Film{metric}"]))
 
     fig.update_yaxes(tickprefix="$ ", ticksuffix="M ", secondary_y=False)
     
     return fig
     
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="blockbuster", function_name="rankingTitle"),
     Output(component_id="ranking-table-title", component_property='children'),
     Input(component_id="metric-select", component_property="value")
 )
 
-def ranking_title(metric):
-    return f"Ranking of film by {metric}"
-
 @app.callback(
     Output(component_id="ages-plot-1", component_property="figure"),
+    Output(component_id="ages-plot-2", component_property="figure"),
+    Output(component_id="ages-plot-3", component_property="figure"),
     Input(component_id="metric-select-ages", component_property="value"),
-    Input(component_id="language-select-ages", component_property="value"),
-    Input(component_id="director-select-ages", component_property="value"),
-    Input(component_id="studio-select-ages", component_property="value"),
-    Input(component_id="country-select-ages", component_property="value"),
-    Input(component_id="date-select-ages", component_property="start_date"),
-    Input(component_id="date-select-ages", component_property="end_date")
+    Input(component_id="age-edges-select", component_property="value"),
+    Input(component_id="filters-ages", component_property="data"),
+    **background.options('ages')
 )
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    
-    if metric == "Actor":
-        df = tables[metric].merge(tables['Cast'][[f'Cast{metric}ID','CastFilmID']], left_index=True, right_on=f'Cast{metric}ID').merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_on='CastFilmID', right_index=True)
-    elif metric == "Director":
-        df = tables[metric].merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_index=True, right_on=f'Film{metric}ID')
-
-    df['Age'] = ( df['FilmReleaseDate'] - df[f'{metric}DOB'] ) / 365
-    df['Age'] = df['Age'].dt.days.round(0)
-    df = df[df['Age'].notna() == True]
-
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
-
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
-
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
+@timing.mark_return
+@background.progressive
+def ages_figures(set_progress, metric, edges, filters):
+    args = (metric, edges, *active_filters(filters))
+    figures = []
+    for figure in [ages_figure_1, ages_figure_2, ages_figure_3]:
+        set_progress((len(figures), 3))
+        figures.append(figure(*args))
+    return tuple(figures)
+
+
+@memoize('ages-data')
+def ages_data(metric, edges, language, director, studio, country, start_date, end_date):
+    # Filtered once for the three figures of the tab; the age categories are precomputed for AGE_EDGES
+    df = filter_frame(metric, language, director, studio, country, start_date, end_date)
+    df = df[df['Age'].notna()]
+    buckets = df['AgeBucket'] if sorted(edges or AGE_EDGES) == sorted(AGE_EDGES) else age_buckets(df['Age'], edges).rename('AgeBucket')
+
+    # One groupby gives both the per-category figures and the shares by year
+    cells = df.groupby(['FilmReleaseYear', buckets], observed=True).agg(
+        Count=(f'{metric}Name', 'count'),
+        FilmBoxOfficeDollars=('FilmBoxOfficeDollars', 'sum'),
+        FilmBoxOfficeDollarsCount=('FilmBoxOfficeDollars', 'count'),
+        FilmBudgetDollars=('FilmBudgetDollars', 'sum'),
+        FilmBudgetDollarsCount=('FilmBudgetDollars', 'count'),
+    )
 
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
+    data = {}
+    totals = cells.groupby(level='AgeBucket', observed=True).sum()
+    data['AgeBucket'] = pd.DataFrame({
+        f'{metric}Name': totals['Count'],
+        'FilmBoxOfficeDollars': totals['FilmBoxOfficeDollars'] / totals['FilmBoxOfficeDollarsCount'],
+        'FilmBudgetDollars': totals['FilmBudgetDollars'] / totals['FilmBudgetDollarsCount'],
+    })
+    counts = cells['Count'].unstack('AgeBucket', fill_value=0).reindex(columns=buckets.cat.categories, fill_value=0)
+    data['FilmReleaseYear'] = counts.div(counts.sum(axis=1), axis=0)
 
-    df['-20years'] = df['Age'] < 20
-    df['20-40years'] = df['Age'].between(20,39)
-    df['40-60years'] = df['Age'].between(40,59)
-    df['+60years'] = df['Age'] >= 60
+    return data
 
-    data= df[['-20years','20-40years','40-60years','+60years',f'{metric}Name']]
-    b=1
-    data['AgeCat'] = ''
-    for i in ['-20years','20-40years','40-60years','+60years']:
-        data.loc[data[i]==True,'AgeCat'] = i
 
-    data = data[['AgeCat',f'{metric}Name']].groupby('AgeCat').count()
+@memoize_figure('ages-plot-1')
+def ages_figure_1(metric, edges, language, director, studio, country, start_date, end_date):
+    
+    data = ages_data(metric, edges, language, director, studio, country, start_date, end_date)['AgeBucket']
 
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
     fig.add_trace(go.Bar(x=data.index, y=data[f"{metric}Name"],offsetgroup=1,name="Number of {metric}s by age category" ), secondary_y=False)
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Repartition of pourcentage of men in the main character")
+    fig.update_layout(title_text=f"Repartition of pourcentage of men in the main character")
 
     return fig
-    
-@app.callback(
-    Output(component_id="ages-plot-2", component_property="figure"),
-    Input(component_id="metric-select-ages", component_property="value"),
-    Input(component_id="language-select-ages", component_property="value"),
-    Input(component_id="director-select-ages", component_property="value"),
-    Input(component_id="studio-select-ages", component_property="value"),
-    Input(component_id="country-select-ages", component_property="value"),
-    Input(component_id="date-select-ages", component_property="start_date"),
-    Input(component_id="date-select-ages", component_property="end_date")
-)
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    
-    if metric == "Actor":
-        df = tables[metric].merge(tables['Cast'][[f'Cast{metric}ID','CastFilmID']], left_index=True, right_on=f'Cast{metric}ID').merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_on='CastFilmID', right_index=True)
-    elif metric == "Director":
-        df = tables[metric].merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_index=True, right_on=f'Film{metric}ID')
-
-    df['Age'] = ( df['FilmReleaseDate'] - df[f'{metric}DOB'] ) / 365
-    df['Age'] = df['Age'].dt.days.round(0)
-    df = df[df['Age'].notna() == True]
-
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
 
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
-
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
-
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
-
-    df['-20years'] = df['Age'] < 20
-    df['20-40years'] = df['Age'].between(20,39)
-    df['40-60years'] = df['Age'].between(40,59)
-    df['+60years'] = df['Age'] >= 60
-
-    data = df[['FilmReleaseYear',f'{metric}Name']].groupby('FilmReleaseYear').count().merge(df[['-20years','20-40years','40-60years','+60years','FilmReleaseYear']].groupby('FilmReleaseYear').sum(),left_index=True,right_index=True)[[f'{metric}Name','-20years','20-40years','40-60years','+60years']]
+@memoize_figure('ages-plot-2')
+def ages_figure_2(metric, edges, language, director, studio, country, start_date, end_date):
     
-    for i in ['-20years','20-40years','40-60years','+60years']:
-        data[i] = data[i]/data[f'{metric}Name']
-
+    data = ages_data(metric, edges, language, director, studio, country, start_date, end_date)['FilmReleaseYear']
 
     fig = go.Figure()
-    fig.add_bar(x=data.index,y=data['-20years'], name="% of -20 years old")
-    fig.add_bar(x=data.index,y=data['20-40years'], name="% of 20-40 years old")
-    fig.add_bar(x=data.index,y=data['40-60years'], name="% of 40-60 years old")
-    fig.add_bar(x=data.index,y=data['+60years'], name="% of +60 years old")   
+    for bucket in data.columns:
+        fig.add_bar(x=data.index,y=data[bucket], name=f"% of {bucket.replace('years', ' years')} old")
     fig.update_layout(barmode="relative")
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Repartition of the age category in the main character by year")
+    fig.update_layout(title_text=f"Repartition of the age category in the main character by year")
 
     return fig
-    
-    
-@app.callback(
-    Output(component_id="ages-plot-3", component_property="figure"),
-    Input(component_id="metric-select-ages", component_property="value"),
-    Input(component_id="language-select-ages", component_property="value"),
-    Input(component_id="director-select-ages", component_property="value"),
-    Input(component_id="studio-select-ages", component_property="value"),
-    Input(component_id="country-select-ages", component_property="value"),
-    Input(component_id="date-select-ages", component_property="start_date"),
-    Input(component_id="date-select-ages", component_property="end_date")
-)
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    
-    if metric == "Actor":
-        df = tables[metric].merge(tables['Cast'][[f'Cast{metric}ID','CastFilmID']], left_index=True, right_on=f'Cast{metric}ID').merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_on='CastFilmID', right_index=True)
-    elif metric == "Director":
-        df = tables[metric].merge(tables['Film'][['FilmBoxOfficeDollars','FilmBudgetDollars','FilmName','FilmReleaseDate','FilmLanguageID','FilmDirectorID','FilmStudioID','FilmCountryID','FilmReleaseYear']], left_index=True, right_on=f'Film{metric}ID')
-
-    df['Age'] = ( df['FilmReleaseDate'] - df[f'{metric}DOB'] ) / 365
-    df['Age'] = df['Age'].dt.days.round(0)
-    df = df[df['Age'].notna() == True]
-    
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
-
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
-
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
 
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
 
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
-
-    df['-20years'] = df['Age'] < 20
-    df['20-40years'] = df['Age'].between(20,39)
-    df['40-60years'] = df['Age'].between(40,59)
-    df['+60years'] = df['Age'] >= 60
-
-    data= df[['-20years','20-40years','40-60years','+60years','FilmBoxOfficeDollars','FilmBudgetDollars']]
-
-    b = 1
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-    data['AgeCat'] = ''
-    for i in ['-20years','20-40years','40-60years','+60years']:
-        data.loc[data[i]==True,'AgeCat'] = i
-
-    data= data[['AgeCat','FilmBoxOfficeDollars','FilmBudgetDollars']].groupby('AgeCat').mean()
+@memoize_figure('ages-plot-3')
+def ages_figure_3(metric, edges, language, director, studio, country, start_date, end_date):
+    
+    data = ages_data(metric, edges, language, director, studio, country, start_date, end_date)['AgeBucket']
 
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
     
     fig.add_trace(go.Bar(x=data.index, y=data[f"FilmBoxOfficeDollars"],offsetgroup=1,name="BoxOffice Dollars" ), secondary_y=False)
 
@@ -688,7 +604,7 @@ def update_table(metric, language, director, studio, country, start_date, end_da
 
     fig.update_yaxes(tickprefix="$ ", ticksuffix="M ", secondary_y=False)
 
-    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='#9fa6b7',title_text=f"Difference between age category",   
+    fig.update_layout(title_text=f"Difference between age category",   
     barmode='group',
     bargap=0.15, # gap between bars of adjacent location coordinates.
     bargroupgap=0.1 # gap between bars of the same location coordinate.
@@ -698,42 +614,33 @@ def update_table(metric, language, director, studio, country, start_date, end_da
     return fig
 
 
-@app.callback(
-    Output(component_id="geo-plot", component_property="figure"),
-    Input(component_id="metric-select-geo", component_property="value"),
-    Input(component_id="language-select-geo", component_property="value"),
-    Input(component_id="director-select-geo", component_property="value"),
-    Input(component_id="studio-select-geo", component_property="value"),
-    Input(component_id="country-select-geo", component_property="value"),
-    Input(component_id="date-select-geo", component_property="start_date"),
-    Input(component_id="date-select-geo", component_property="end_date")
-)
-def update_table(metric, language, director, studio, country, start_date, end_date):
-    
-    df = tables['Film'].merge(tables["Country"], left_on='FilmCountryID', right_index=True)
+@memoize('geo-data')
+def geo_data(language, director, studio, country, start_date, end_date):
 
-    if language != 'All':
-        df = df[df['FilmLanguageID'] == language]
+    df = filter_frame('Country', language, director, studio, country, start_date, end_date)
 
-    if director != 'All':
-        df = df[df['FilmDirectorID'] == director]
+    return df[['CountryCode','FilmBoxOfficeDollars','FilmBudgetDollars','FilmBenefits']].groupby('CountryCode', observed=True).mean().merge(df[['CountryCode','FilmName']].groupby('CountryCode', observed=True).count(),left_index=True,right_index=True)
 
-    if studio != 'All':
-        df = df[df['FilmStudioID'] == studio]
 
-    if country != 'All':
-        df = df[df['FilmCountryID'] == country]
+@app.callback(
+    Output(component_id="geo-plot", component_property="figure"),
+    Input(component_id="metric-select-geo", component_property="value"),
+    Input(component_id="filters-geo", component_property="data"),
+    **background.options('geo')
+)
+@timing.mark_return
+@patch_on("metric-select-geo")
+@background.progressive
+def geo_plot(set_progress, metric, filters):
+    set_progress((0, 1))
+    return geo_figure(metric, *active_filters(filters))
 
-    df = df[df['FilmReleaseDate'].between(start_date, end_date)]
 
-    if metric == "Average":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits','FilmReleaseYear']].groupby('FilmReleaseYear').mean()
-    if metric == "Total":
-        data = df[['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits','FilmReleaseYear']].groupby('FilmReleaseYear').sum()
+@memoize_figure('geo-plot')
+def geo_figure(metric, language, director, studio, country, start_date, end_date):
     
-    df = df[['CountryCode','FilmBoxOfficeDollars','FilmBudgetDollars','FilmBenefits']].groupby('CountryCode').mean().merge(df[['CountryCode','FilmName']].groupby('CountryCode').count(),left_index=True,right_index=True)
+    df = geo_data(language, director, studio, country, start_date, end_date)
 
-    
 
     fig = go.Figure(data=go.Choropleth(
     locations = df.index,
@@ -772,6 +679,8 @@ def update_table(metric, language, director, studio, country, start_date, end_da
 )
     fig.update_traces(hovertemplate = 'BoxOffice=$ %{text}M<br>iso_alpha=%{location}<extra></extra>', text = df[f'Film{metric}'])
     fig.update_layout(geo=dict(bgcolor= 'rgba(0,0,0,0)')  ) 
+    # The map keeps the light background it had before the dark template
+    fig.update_layout(paper_bgcolor='white', font_color='#2a3f5f')
   
 
 
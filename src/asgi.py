@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import server
+
+# ASGI entry point: the Flask server runs in a pool of BLOCKBUSTER_THREADS threads behind uvicorn,
+#   BLOCKBUSTER_WORKER_CLASS=asgi gunicorn -c gunicorn.conf.py --chdir src asgi:app
+app = WSGIMiddleware(server, workers=int(os.environ.get('BLOCKBUSTER_THREADS', 8)))
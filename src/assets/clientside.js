@@ -0,0 +1,44 @@
+// Presentation-only callbacks, run in the browser without a request to the server
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    blockbuster: {
+        rankingTitle: function(metric) {
+            return "Ranking of film by " + metric;
+        },
+
+        // evolution-store holds the figure for "Average" and the y series of every trace for both metrics
+        evolutionFigure: function(metric, store) {
+            if (!store || !store.series[metric]) {
+                return window.dash_clientside.no_update;
+            }
+            const figure = JSON.parse(JSON.stringify(store.figure));
+            store.series[metric].forEach(function(y, position) {
+                figure.data[position].y = y;
+            });
+            figure.layout.title = store.titles[metric];
+            return figure;
+        }
+    }
+});
+
+// Filter stores are written once a burst of changes has settled, tagged with a sequence
+// number so the server can drop requests made obsolete by a newer one (see coalesce.py)
+const FILTER_DEBOUNCE_MS = 300;
+const filterClient = Math.random().toString(36).slice(2, 12);
+const filterSeq = {};
+
+window.dash_clientside.blockbuster.debounceFilters = function(language, director, studio, country, startDate, endDate) {
+    const tab = window.dash_clientside.callback_context.inputs_list[0].id.replace("language-select-", "");
+    const store = "filters-" + tab;
+    const first = !(store in filterSeq);
+    const seq = (filterSeq[store] || 0) + 1;
+    filterSeq[store] = seq;
+    const data = {client: filterClient, tab: tab, seq: seq, filters: [language, director, studio, country, startDate, endDate]};
+    if (first) {
+        return data;
+    }
+    return new Promise(function(resolve) {
+        setTimeout(function() {
+            resolve(filterSeq[store] === seq ? data : window.dash_clientside.no_update);
+        }, FILTER_DEBOUNCE_MS);
+    });
+};
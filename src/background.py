@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import functools
+import os
+import pathlib
+
+from dash.dependencies import Output
+
+import cache
+from data import DATA_DIR
+
+# BLOCKBUSTER_BACKGROUND=1 runs the slowest callbacks as Dash background callbacks: the request
+# returns at once and the browser polls for the result, which a separate process computes.
+# The jobs and their results live in a diskcache directory, so no broker is needed; the
+# dash[diskcache] extra in requirements.txt brings diskcache, multiprocess and psutil.
+BACKGROUND = os.environ.get('BLOCKBUSTER_BACKGROUND', '0') == '1'
+JOBS_DIR = pathlib.Path(os.environ.get('BLOCKBUSTER_JOBS_DIR') or (cache.CACHE_DIR or DATA_DIR) / 'jobs')
+
+manager = None
+if BACKGROUND:
+    import diskcache
+    from dash import DiskcacheManager
+
+    # diskcache unpickles the jobs too, so the queue gets the same checks as the shared cache
+    manager = DiskcacheManager(diskcache.Cache(cache.private_directory(JOBS_DIR / 'queue')))
+    # Every job runs in a new process and its LRU caches go with it, so the memoized results
+    # are kept in the disk cache shared by the workers. Dash's own result cache is left off:
+    # the filter stores carry a per-client sequence number that would make every key unique.
+    if cache.shared is None:
+        cache.shared = cache.DiskCache(JOBS_DIR / 'results')
+
+
+def options(name:str)->dict:
+    # Extra app.callback arguments, with a progress bar `{name}-progress` shown while the job runs
+    if manager is None:
+        return {}
+    return {
+        'background': True,
+        'manager': manager,
+        'progress': [Output(f'{name}-progress', 'value'), Output(f'{name}-progress', 'max')],
+        'running': [(Output(f'{name}-progress', 'style'), {'visibility': 'visible'}, {'visibility': 'hidden'})],
+    }
+
+
+def progressive(func):
+    # Background callbacks get a set_progress function as first argument, this passes
+    # a no-op one when they run in the request instead
+    if manager is not None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        return func(lambda progress: None, *args)
+    return wrapper
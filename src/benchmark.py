@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Calls the callbacks of app.py directly, outside a browser, over a matrix of filter combinations
+# and on the bundled data replicated 1, 10, 100 and 1000 times. Each combination is timed
+# --repeats times and keeps its fastest call, the least disturbed by the rest of the machine;
+# the p50/p95 are over the combinations. The peak is the memory traced during one call.
+# The p50 and the peak are compared with the baseline file, the p95 of a dozen combinations is
+# shown but too noisy to gate on: either more than --threshold and more than MIN_SECONDS/MIN_BYTES
+# above the baseline is flagged and the exit status is 1. Timings only compare on the same machine,
+# so the baseline is saved locally (it is not committed), e.g. before making a change:
+#
+#   python src/benchmark.py --scales 1 10 --save  write the baseline for these scales
+#   python src/benchmark.py --scales 1 10         compare with it
+#
+# Each scale runs in its own process, with the results caches turned off so every call computes.
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+DATA_DIR = pathlib.Path(__file__).resolve().parent / 'data'
+BASELINE = ROOT / 'benchmark_baseline.json'
+
+# Tables copied once per replica, with their IDs and the IDs they reference shifted past the previous replica
+REPLICATED = {
+    'Film': [('FilmID', 'Film'), ('FilmDirectorID', 'Director')],
+    'Actor': [('ActorID', 'Actor')],
+    'Director': [('DirectorID', 'Director')],
+    'Cast': [('CastID', 'Cast'), ('CastFilmID', 'Film'), ('CastActorID', 'Actor')],
+}
+FILTER_COLUMNS = ['FilmLanguageID', 'FilmDirectorID', 'FilmStudioID', 'FilmCountryID']
+# Calls per filter combination when --repeats is not given; the small scales are the noisiest
+REPEATS = {1: 10, 10: 10, 100: 5}
+# Differences below these are noise on a shared machine, whatever the relative threshold
+MIN_SECONDS = 0.005
+MIN_BYTES = 2**20
+
+
+def write_scaled(directory:pathlib.Path, factor:int):
+    frames = {path.stem[len('tbl'):]: pd.read_csv(path) for path in DATA_DIR.glob('tbl*.csv')}
+    spans = {name: int(frames[name][f'{name}ID'].max()) for name in REPLICATED}
+    for name, df in frames.items():
+        if name in REPLICATED:
+            copies = []
+            for replica in range(factor):
+                copy = df.copy()
+                for column, table in REPLICATED[name]:
+                    copy[column] = copy[column] + replica * spans[table]
+                if replica and f'{name}Name' in copy:
+                    copy[f'{name}Name'] = copy[f'{name}Name'] + f' {replica}'
+                copies.append(copy)
+            df = pd.concat(copies)
+        df.to_csv(directory / f'tbl{name}.csv', index=False)
+
+
+def filter_matrix(films:pd.DataFrame)->list:
+    # No filter, each filter on its most frequent value, and two together, over all dates and over a decade
+    top = {column: films[column].mode().iloc[0].item() for column in FILTER_COLUMNS}
+    combinations = [{}] + [{column: value} for column, value in top.items()]
+    combinations.append({'FilmLanguageID': top['FilmLanguageID'], 'FilmStudioID': top['FilmStudioID']})
+    dates = [(films['FilmReleaseDate'].min().date().isoformat(), films['FilmReleaseDate'].max().date().isoformat()), ('2000-01-01', '2009-12-31')]
+    return [
+        {'filters': [combination.get(column, 'All') for column in FILTER_COLUMNS] + [start_date, end_date]}
+        for combination in combinations for start_date, end_date in dates
+    ]
+
+
+def callbacks(app)->dict:
+    def ranking(store):
+        selection = app.ranking_selection(store)
+        app.ranking_table('BoxOfficeDollars', selection, 0, 10, [], '')
+        app.ranking_figure('BoxOfficeDollars', 10, selection)
+
+    return {
+        'actor': lambda store: app.actor_plot('BoxOfficeDollars', 'Average', 10, store),
+        'director': lambda store: app.director_plot('BoxOfficeDollars', 'Average', 10, store),
+        'studio': lambda store: app.studio_plot('BoxOfficeDollars', 'Average', 10, store),
+        'evolution': app.evolution_series,
+        'ranking': ranking,
+        'inclusivity': lambda store: app.inclusivity_figures('Actor', store),
+        'ages': lambda store: app.ages_figures('Actor', [20, 40, 60], store),
+        'geo': lambda store: app.geo_plot('BoxOfficeDollars', store),
+    }
+
+
+def run(repeats:int)->dict:
+    import app
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    # patch_on reads the triggering inputs; none means the callback returns whole figures
+    context_value.set(AttributeDict(triggered_inputs=[]))
+    stores = filter_matrix(app.facts['Film'])
+    results = {}
+    for name, call in callbacks(app).items():
+        latencies, peaks = [], []
+        for store in stores:
+            fastest = float('inf')
+            for _ in range(repeats):
+                started = time.perf_counter()
+                call(store)
+                fastest = min(fastest, time.perf_counter() - started)
+            latencies.append(fastest)
+            tracemalloc.start()
+            call(store)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        results[name] = {
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'peak': max(peaks),
+        }
+    return results
+
+
+def measure(factor:int, repeats:int)->dict:
+    with tempfile.TemporaryDirectory() as directory:
+        write_scaled(pathlib.Path(directory), factor)
+        output = pathlib.Path(directory) / 'results.json'
+        env = dict(os.environ, BLOCKBUSTER_DATA_DIR=directory, BLOCKBUSTER_CACHE_SIZE='0', BLOCKBUSTER_LOG_LEVEL='WARNING')
+        for name in ['BLOCKBUSTER_CACHE_DIR', 'BLOCKBUSTER_SNAPSHOT_DIR', 'BLOCKBUSTER_BACKGROUND']:
+            env.pop(name, None)
+        subprocess.run([sys.executable, __file__, '--child', str(output), '--repeats', str(repeats)], cwd=pathlib.Path(__file__).parent, env=env, check=True)
+        return json.loads(output.read_text())
+
+
+def compare(results:dict, baseline:dict, threshold:float)->int:
+    regressions = 0
+    floors = {'p50': MIN_SECONDS, 'peak': MIN_BYTES}
+    print(f'{"scale":>6} {"callback":<12}{"p50":>10}{"p95":>10}{"peak":>11}{"base p50":>11}{"base p95":>11}{"base peak":>12}')
+    for scale, callbacks in results.items():
+        for name, result in callbacks.items():
+            base = baseline.get(scale, {}).get(name)
+            line = f'{scale:>6} {name:<12}{result["p50"] * 1000:>7.1f} ms{result["p95"] * 1000:>7.1f} ms{result["peak"] / 2**20:>7.1f} MiB'
+            if base is not None:
+                line += f'{base["p50"] * 1000:>8.1f} ms{base["p95"] * 1000:>8.1f} ms{base["peak"] / 2**20:>8.1f} MiB'
+                slower = [key for key, floor in floors.items() if result[key] - base[key] > max(base[key] * threshold, floor)]
+                if slower:
+                    regressions += 1
+                    line += f'  REGRESSION ({", ".join(slower)})'
+            print(line)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeats', type=int, help='calls per filter combination, by default 10 at the small scales and 3 at 1000x')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed increase over the baseline, 0.25 is 25%%')
+    parser.add_argument('--baseline', type=pathlib.Path, default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--child', type=pathlib.Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.child.write_text(json.dumps(run(args.repeats)))
+        sys.exit(0)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    missing = [f'{scale}x' for scale in args.scales if f'{scale}x' not in baseline]
+    if missing and not args.save:
+        sys.exit(f'No baseline for {", ".join(missing)} in {args.baseline}: run with --save on this machine first, '
+                 f'e.g. on the unchanged tree')
+
+    results = {f'{scale}x': measure(scale, args.repeats or REPEATS.get(scale, 3)) for scale in args.scales}
+    regressions = compare(results, baseline, args.threshold)
+    if args.save:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2) + '\n')
+        print(f'Baseline written to {args.baseline}')
+    elif regressions:
+        print(f'{regressions} callbacks regressed by more than {args.threshold:.0%}')
+        sys.exit(1)
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from data import DATA_DIR, load_info, on_reload
+from figures import figure_json
+from timing import timed
+
+CACHE_SIZE = int(os.environ.get('BLOCKBUSTER_CACHE_SIZE', 256))
+# Memory budget of each in-process cache, on top of its number of entries
+CACHE_MEMORY = int(os.environ.get('BLOCKBUSTER_CACHE_MEMORY', 64 * 2**20))
+# Setting BLOCKBUSTER_CACHE_DIR shares results between gunicorn workers through the file system;
+# a relative path is taken from the data directory
+CACHE_DIR = DATA_DIR / os.environ['BLOCKBUSTER_CACHE_DIR'] if os.environ.get('BLOCKBUSTER_CACHE_DIR') else None
+CACHE_TTL = float(os.environ.get('BLOCKBUSTER_CACHE_TTL', 3600))
+CACHE_MAX_BYTES = int(os.environ.get('BLOCKBUSTER_CACHE_MAX_BYTES', 512 * 2**20))
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def nbytes(value)->int:
+    # Approximate memory of a cached value: the buffers of arrays and frames, the length of JSON
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True))
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+
+    def __init__(self, name:str, maxsize:int=CACHE_SIZE, max_bytes:int=CACHE_MEMORY):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        size = nbytes(value)
+        if self.maxsize <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            self.nbytes += size - self._sizes.get(key, 0)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or self.nbytes > self.max_bytes:
+                oldest, _ = self._data.popitem(last=False)
+                self.nbytes -= self._sizes.pop(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    # One file per entry, written to a temporary name and renamed into place so that
+    # concurrent workers never see a partial write. Each file starts with its creation
+    # time for the TTL; the mtime is bumped on every hit and drives the size-based eviction.
+
+    HEADER = struct.Struct('<d')
+    PRUNE_EVERY = 32
+
+    def __init__(self, directory:str, ttl:float=CACHE_TTL, max_bytes:int=CACHE_MAX_BYTES):
+        self.directory = private_directory(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        # Keys are scoped to the loaded data and to this version of the code
+        self.namespace = code_version()
+
+    def _path(self, name:str, key:tuple)->pathlib.Path:
+        digest = hashlib.sha1(repr((self.namespace, load_info.get('fingerprint'), name, key)).encode()).hexdigest()
+        return self.directory / f'{name}-{digest}.cache'
+
+    def get(self, name:str, key:tuple, default=None):
+        path = self._path(name, key)
+        try:
+            with open(path, 'rb') as file:
+                payload = file.read()
+            (created,) = self.HEADER.unpack_from(payload)
+            if time.time() - created > self.ttl:
+                path.unlink(missing_ok=True)
+                raise FileNotFoundError(path)
+            value = pickle.loads(payload[self.HEADER.size:])
+            os.utime(path)
+        except (FileNotFoundError, struct.error, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, name:str, key:tuple, value):
+        payload = self.HEADER.pack(time.time()) + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(payload)
+            os.replace(tmp, self._path(name, key))
+        except OSError:
+            pathlib.Path(tmp).unlink(missing_ok=True)
+            return
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        entries = []
+        now = time.time()
+        for path in self.directory.glob('*.cache'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob('*.cache'):
+            path.unlink(missing_ok=True)
+
+
+def private_directory(directory)->pathlib.Path:
+    # Cached values are unpickled, so anyone who can write to the directory could run code in the
+    # workers: it has to belong to this user and be writable by no one else, even if it already existed
+    path = pathlib.Path(directory)
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    stat = path.stat()
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+        raise PermissionError(f'{path} must be owned by this user and not writable by group or others')
+    return path
+
+
+def code_version()->str:
+    stats = sorted((path.name, path.stat().st_mtime_ns) for path in pathlib.Path(__file__).parent.glob('**/*.py'))
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:16]
+
+
+caches = {}
+shared = DiskCache(CACHE_DIR) if CACHE_DIR else None
+
+
+@on_reload
+def clear_all():
+    for cache in caches.values():
+        cache.clear()
+
+
+def normalize(value):
+    # Dash sends dates as either '2010-01-01' or '2010-01-01T00:00:00', lists for multi-value inputs
+    # and dicts for properties such as a DataTable's sort_by
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize(v)) for key, v in value.items()))
+    if isinstance(value, str) and DATE_PATTERN.match(value):
+        return pd.Timestamp(value).isoformat()
+    return value
+
+
+def make_key(args:tuple)->tuple:
+    return tuple(normalize(arg) for arg in args)
+
+
+def cached_call(name:str, args:tuple, compute):
+    # Looks in this worker's LRU first, then in the cache shared by all workers
+    cache = caches[name]
+    with timed('cache'):
+        key = make_key(args)
+        value = cache.get(key)
+        if value is None and shared is not None:
+            value = shared.get(name, key)
+            if value is not None:
+                cache.set(key, value)
+    if value is None:
+        value = compute(*args)
+        with timed('cache'):
+            cache.set(key, value)
+            if shared is not None:
+                shared.set(name, key, value)
+    return value
+
+
+def memoize(name:str, maxsize:int=CACHE_SIZE):
+    # Cached values are shared between requests, so callers must treat them as read-only
+    caches[name] = LRUCache(name, maxsize)
+
+    def decorator(func):
+        compute = timed('groupby')(func)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            return cached_call(name, args, compute)
+        return wrapper
+    return decorator
+
+
+def memoize_figure(name:str, maxsize:int=CACHE_SIZE):
+    # Stores the serialized, trimmed figure JSON rather than the go.Figure
+    caches[name] = LRUCache(name, maxsize)
+
+    def decorator(func):
+        build, serialize = timed('figure')(func), timed('serialize')(figure_json)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            figure = cached_call(name, args, lambda *args: serialize(build(*args)))
+            with timed('serialize'):
+                return json.loads(figure)
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import time
+
+from dash.exceptions import PreventUpdate
+
+import cache
+from cache import LRUCache
+
+# The filters of each tab reach the server through a store written by the browser
+# (assets/clientside.js): {'client': id of the page, 'tab': ..., 'seq': n, 'filters': [...]}.
+# A request carrying an older seq than one already seen for the same page and tab was made
+# obsolete by a newer change, and is dropped before doing any work.
+
+CLIENT_PATTERN = re.compile(r'^[0-9a-z]{1,32}$')
+
+latest = LRUCache('filter-seq', 4096)
+# Threaded workers serve several requests of the same page at once
+latest_lock = threading.Lock()
+
+
+class SequenceFiles:
+    # The newest seq of each page and tab for all workers, one small file each replaced in one go.
+    # It sits next to the shared cache rather than in it, out of its hit counts, and drops the
+    # files of pages not seen for the cache TTL every PRUNE_EVERY writes.
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, directory:pathlib.Path, ttl:float):
+        self.directory = cache.private_directory(directory)
+        self.ttl = ttl
+        self._writes = 0
+
+    def _path(self, key:tuple)->pathlib.Path:
+        return self.directory / hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key:tuple)->int:
+        try:
+            return int(self._path(key).read_text())
+        except (FileNotFoundError, ValueError):
+            return -1
+
+    def set(self, key:tuple, seq:int):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(str(seq))
+            os.replace(tmp, self._path(key))
+        except OSError:
+            pathlib.Path(tmp).unlink(missing_ok=True)
+            return
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        now = time.time()
+        for path in self.directory.iterdir():
+            try:
+                if now - path.stat().st_mtime > self.ttl:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+
+@functools.cache
+def sequence_files(directory:pathlib.Path, ttl:float)->SequenceFiles:
+    return SequenceFiles(directory, ttl)
+
+
+def newest_seq(client:str, tab:str, seq:int)->int:
+    # Records seq and returns the newest one known for this page and tab, across workers when a shared cache is set;
+    # the files are read and written outside the lock, a seq already known to be stale never reaches them
+    key = (client, tab)
+    with latest_lock:
+        newest = max(seq, latest.get(key, -1))
+        latest.set(key, newest)
+    if newest > seq or cache.shared is None:
+        return newest
+
+    files = sequence_files(cache.shared.directory / 'filter-seq', cache.shared.ttl)
+    stored = files.get(key)
+    if stored < seq:
+        files.set(key, seq)
+    elif stored > seq:
+        with latest_lock:
+            latest.set(key, max(stored, latest.get(key, -1)))
+    return max(seq, stored)
+
+
+def active_filters(store:dict|None)->list:
+    if not store:
+        raise PreventUpdate
+    client, seq = str(store.get('client', '')), int(store.get('seq', 0))
+    if CLIENT_PATTERN.match(client) and newest_seq(client, store.get('tab'), seq) > seq:
+        raise PreventUpdate
+    return store['filters']
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import pandas as pd
+
+from data import facts, on_reload
+from filters import FilterIndex, filter_frame
+from startup import phase
+
+ENTITIES = ['Actor', 'Director', 'Studio']
+METRICS = ['FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmBenefits']
+DIMENSIONS = ['FilmLanguageID', 'FilmDirectorID', 'FilmStudioID', 'FilmCountryID', 'FilmReleaseYear']
+COUNTS = [f'{metric}Count' for metric in METRICS] + ['FilmNameCount']
+
+
+def partials(df:pd.DataFrame, entity:str)->pd.DataFrame:
+    # Sums and non-null counts are enough to rebuild both the mean and the total of any slice
+    keys = [f'{entity}Name'] + DIMENSIONS
+    df = df[df[f'{entity}Name'].notna() & df['FilmReleaseYear'].notna()]
+    grouped = df[keys + METRICS + ['FilmName']].groupby(keys, dropna=False, sort=False, observed=True)
+    return grouped[METRICS].sum().join(grouped[METRICS + ['FilmName']].count().add_suffix('Count')).reset_index()
+
+
+class Cube:
+
+    def __init__(self, entity:str, df:pd.DataFrame):
+        self.entity = entity
+        self.cells = partials(df, entity)
+        # The cells are indexed like a fact frame, with every cell dated on January 1st of its year
+        self.cells['FilmReleaseDate'] = pd.to_datetime(self.cells['FilmReleaseYear'].astype(int).astype(str), format='%Y')
+        self.index = FilterIndex(self.cells)
+
+    def rollup(self, language, director, studio, country, start_date, end_date)->pd.DataFrame:
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        parts = []
+
+        # Whole years strictly inside the range come straight from the cube
+        if start.year + 1 <= end.year - 1:
+            positions = self.index.select(language, director, studio, country, pd.Timestamp(start.year + 1, 1, 1), pd.Timestamp(end.year - 1, 1, 1))
+            parts.append(self.cells.take(positions))
+
+        # The edge years are cut at the exact dates, so they are aggregated from the fact rows
+        if start <= end:
+            edges = [(start, end)] if start.year == end.year else [(start, year_end(start.year)), (pd.Timestamp(end.year, 1, 1), end)]
+            for edge_start, edge_end in edges:
+                parts.append(partials(filter_frame(self.entity, language, director, studio, country, edge_start, edge_end), self.entity))
+
+        name = f'{self.entity}Name'
+        if not parts:
+            return pd.DataFrame(columns=METRICS + COUNTS, index=pd.Index([], name=name), dtype=float)
+        return pd.concat(parts)[[name] + METRICS + COUNTS].groupby(name, observed=True).sum()
+
+    def query(self, metric2, language, director, studio, country, start_date, end_date)->pd.DataFrame:
+        totals = self.rollup(language, director, studio, country, start_date, end_date)
+
+        if metric2 == "Average":
+            data = pd.DataFrame({metric: totals[metric] / totals[f'{metric}Count'] for metric in METRICS})
+        elif metric2 == "Total":
+            data = totals[METRICS].copy()
+
+        data['FilmName'] = totals['FilmNameCount']
+        return data
+
+
+def year_end(year:int)->pd.Timestamp:
+    return pd.Timestamp(year + 1, 1, 1) - pd.Timedelta(1, 'ns')
+
+
+cubes = {}
+
+
+@on_reload
+def build_cubes():
+    with phase('cubes'):
+        cubes.clear()
+        cubes.update({entity: Cube(entity, facts[entity]) for entity in ENTITIES})
+
+
+build_cubes()
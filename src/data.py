@@ -1,21 +1,194 @@
 import pandas as pd
 import pathlib
-import country_converter as coco
+import hashlib
+import logging
+import os
+import time
 
-p = pathlib.Path('.')
-path_name = {path:path.name.replace('tbl','').replace('.csv', '') for path in list(p.glob('**/*.csv'))}
-tables = {path.name.replace('tbl','').replace('.csv', ''):pd.read_csv(path, index_col=f'{path_name[path]}ID') for path in path_name}
+import snapshot
+from startup import phase
 
+logger = logging.getLogger(__name__)
 
-tables['Film'] = tables[tables['Film'][['FilmBoxOfficeDollars']].isna() == False]
+DATA_DIR = pathlib.Path(os.environ.get('BLOCKBUSTER_DATA_DIR', pathlib.Path(__file__).parent / 'data'))
+# Built by `python src/snapshot.py`; the CSVs are only parsed when it is missing or stale
+SNAPSHOT_DIR = pathlib.Path(os.environ.get('BLOCKBUSTER_SNAPSHOT_DIR', DATA_DIR / 'snapshot'))
+# Compact mode keeps names and IDs as categoricals and numbers as float32/small ints,
+# and drops the text columns no callback reads
+COMPACT = os.environ.get('BLOCKBUSTER_COMPACT', '0') == '1'
+# Snapshot columns are memory-mapped read-only, so forked gunicorn workers share their pages
+MMAP = os.environ.get('BLOCKBUSTER_MMAP', '1') == '1'
+UNUSED_COLUMNS = ['FilmSynopsis', 'CastCharacterName']
+# Lower bounds of the age categories precomputed for the Age tab, e.g. "20,40,60"
+AGE_EDGES = [int(edge) for edge in os.environ.get('BLOCKBUSTER_AGE_EDGES', '20,40,60').split(',')]
 
-tables['Film']['FilmReleaseDate'] = pd.to_datetime(tables['Film']['FilmReleaseDate'])
-tables['Film']['FilmBoxOfficeDollars'] = tables['Film']['FilmBoxOfficeDollars'] /10**6
-tables['Film']['FilmBudgetDollars'] = tables['Film']['FilmBudgetDollars'] /10**6
-tables['Film']['FilmBenefits'] = tables['Film']['FilmBoxOfficeDollars'] - tables['Film']['FilmBudgetDollars']
-tables['Film']['FilmReleaseDate'] = pd.to_datetime(tables['Film']['FilmReleaseDate'])
-tables['Film']['FilmReleaseYear'] = tables['Film']['FilmReleaseDate'].dt.year
-tables['Actor']['ActorDOB'] = pd.to_datetime(tables['Actor']['ActorDOB'])
-tables['Director']['DirectorDOB'] = pd.to_datetime(tables['Director']['DirectorDOB'])
-cc = coco.CountryConverter()
-tables['Country']['CountryCode'] = cc.pandas_convert(tables['Country']['CountryName'])
\ No newline at end of file
+# ISO3 codes of the countries in tblCountry. country_converter loads a large table of its own,
+# so it is only imported for names missing here; the snapshot stores the resolved codes.
+COUNTRY_CODES = {
+    'China': 'CHN',
+    'France': 'FRA',
+    'Germany': 'DEU',
+    'Japan': 'JPN',
+    'New Zealand': 'NZL',
+    'Russia': 'RUS',
+    'United Kingdom': 'GBR',
+    'United States': 'USA',
+}
+
+tables = {}
+facts = {}
+load_info = {}
+reload_hooks = []
+
+
+def read_csv_tables(data_dir:pathlib.Path)->dict:
+    path_name = {path:path.name.replace('tbl','').replace('.csv', '') for path in data_dir.glob('tbl*.csv')}
+    loaded = {path_name[path]:pd.read_csv(path, index_col=f'{path_name[path]}ID') for path in path_name}
+
+
+    loaded['Film'] = loaded['Film'][loaded['Film']['FilmBoxOfficeDollars'].isna() == False].copy()
+
+    loaded['Film']['FilmReleaseDate'] = pd.to_datetime(loaded['Film']['FilmReleaseDate'])
+    loaded['Film']['FilmBoxOfficeDollars'] = loaded['Film']['FilmBoxOfficeDollars'] /10**6
+    loaded['Film']['FilmBudgetDollars'] = loaded['Film']['FilmBudgetDollars'] /10**6
+    loaded['Film']['FilmBenefits'] = loaded['Film']['FilmBoxOfficeDollars'] - loaded['Film']['FilmBudgetDollars']
+    loaded['Film']['FilmReleaseYear'] = loaded['Film']['FilmReleaseDate'].dt.year
+    loaded['Actor']['ActorDOB'] = pd.to_datetime(loaded['Actor']['ActorDOB'])
+    loaded['Director']['DirectorDOB'] = pd.to_datetime(loaded['Director']['DirectorDOB'])
+    loaded['Country']['CountryCode'] = country_codes(loaded['Country']['CountryName'])
+
+    return loaded
+
+
+def country_codes(names:pd.Series)->pd.Series:
+    codes = names.map(COUNTRY_CODES)
+    missing = codes.isna() & names.notna()
+    if missing.any():
+        import country_converter as coco
+        codes[missing] = coco.CountryConverter().pandas_convert(names[missing])
+    return codes
+
+
+def csv_fingerprint(data_dir:pathlib.Path)->str:
+    # Identifies the source CSVs, so neither a snapshot nor a cached result is reused against other data
+    stats = sorted((path.name, path.stat().st_size, path.stat().st_mtime_ns) for path in data_dir.glob('tbl*.csv'))
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:16]
+
+
+def snapshot_key(fingerprint:str)->str:
+    # A snapshot is only used by the dtype mode it was built for
+    return f'{fingerprint}-compact' if COMPACT else fingerprint
+
+
+def load():
+    started = time.perf_counter()
+    fingerprint = csv_fingerprint(DATA_DIR)
+    with phase('read snapshot'):
+        frames = snapshot.read(SNAPSHOT_DIR, snapshot_key(fingerprint), UNUSED_COLUMNS if COMPACT else [], categorical=COMPACT, mmap=MMAP)
+
+    if frames is not None:
+        loaded = {name: df for name, df in frames.items() if not name.startswith('fact.')}
+        loaded_facts = {name[len('fact.'):]: df for name, df in frames.items() if name.startswith('fact.')}
+        loaded_facts['Film'] = loaded['Film']
+        load_info['source'] = 'snapshot'
+    else:
+        logger.warning('No up-to-date snapshot in %s, parsing the CSVs in %s', SNAPSHOT_DIR, DATA_DIR)
+        with phase('read csv'):
+            loaded = read_csv_tables(DATA_DIR)
+        with phase('build facts'):
+            loaded_facts = build_facts(loaded)
+        load_info['source'] = 'csv'
+
+    if COMPACT:
+        with phase('compact'):
+            loaded = {name: compact(df) for name, df in loaded.items()}
+            loaded_facts = {name: compact(df) for name, df in loaded_facts.items() if name != 'Film'}
+            loaded_facts['Film'] = loaded['Film']
+
+    # tables and facts are updated in place because the pages and callbacks import them by name
+    tables.clear()
+    tables.update(loaded)
+    facts.clear()
+    facts.update(loaded_facts)
+    load_info['fingerprint'] = fingerprint
+    load_info['seconds'] = time.perf_counter() - started
+
+
+def compact(df:pd.DataFrame)->pd.DataFrame:
+    # Columns that already have their compact dtype are left alone, so memory-mapped ones stay mapped
+    unused = [column for column in UNUSED_COLUMNS if column in df.columns]
+    if unused:
+        df = df.drop(columns=unused)
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Sorted like astype('category') would, so grouping by them keeps the default order
+            if not values.cat.ordered and not values.cat.categories.is_monotonic_increasing:
+                df[column] = values.cat.reorder_categories(values.cat.categories.sort_values())
+        elif values.dtype == object or column.endswith('ID'):
+            df[column] = values.astype('category')
+        elif pd.api.types.is_float_dtype(values):
+            if values.dtype != 'float32':
+                df[column] = values.astype('float32')
+        elif pd.api.types.is_integer_dtype(values):
+            downcast = pd.to_numeric(values, downcast='integer')
+            if downcast.dtype != values.dtype:
+                df[column] = downcast
+    if pd.api.types.is_integer_dtype(df.index):
+        index = pd.to_numeric(df.index, downcast='integer')
+        if index.dtype != df.index.dtype:
+            df.index = pd.Index(index, name=df.index.name)
+    return df
+
+
+def frame_memory()->dict:
+    memory = {f'table.{name}': df.memory_usage(deep=True).sum() for name, df in tables.items()}
+    # facts['Film'] is tables['Film'] itself
+    memory.update({f'fact.{name}': df.memory_usage(deep=True).sum() for name, df in facts.items() if name != 'Film'})
+    return memory
+
+
+def memory_report()->str:
+    memory = frame_memory()
+    lines = [f'Loaded frames ({"compact" if COMPACT else "default"} dtypes):']
+    lines += [f'  {name:<20}{size / 2**20:9.3f} MiB' for name, size in memory.items()]
+    lines.append(f'  {"total":<20}{sum(memory.values()) / 2**20:9.3f} MiB')
+    return '\n'.join(lines)
+
+
+def build_facts(tables:dict)->dict:
+    # Denormalized fact frames, joined once at load time so the callbacks only have to slice them
+    facts = {}
+    facts['Film'] = tables['Film']
+    facts['Actor'] = tables['Actor'].merge(tables['Cast'], left_index=True, right_on='CastActorID').merge(tables['Film'], left_on='CastFilmID', right_index=True)
+    facts['Director'] = tables['Director'].merge(tables['Film'], left_index=True, right_on='FilmDirectorID')
+    facts['Studio'] = tables['Studio'].merge(tables['Film'], left_index=True, right_on='FilmStudioID')
+    facts['Country'] = tables['Film'].merge(tables['Country'], left_on='FilmCountryID', right_index=True)
+
+    for role in ['Actor', 'Director']:
+        # Completed 365-day years between the birth and the release
+        facts[role]['Age'] = ((facts[role]['FilmReleaseDate'] - facts[role][f'{role}DOB']).dt.days // 365).astype('Int16')
+        facts[role]['AgeBucket'] = age_buckets(facts[role]['Age'], AGE_EDGES)
+
+    return facts
+
+
+def age_buckets(ages:pd.Series, edges:list)->pd.Series:
+    # Ordered categories such as '-20years', '20-40years', '40-60years', '+60years'
+    edges = sorted(edges)
+    labels = [f'-{edges[0]}years'] + [f'{low}-{high}years' for low, high in zip(edges, edges[1:])] + [f'+{edges[-1]}years']
+    return pd.cut(ages, [-float('inf')] + edges + [float('inf')], right=False, labels=labels)
+
+
+def on_reload(hook):
+    reload_hooks.append(hook)
+    return hook
+
+
+def reload():
+    load()
+    for hook in reload_hooks:
+        hook()
+
+
+load()
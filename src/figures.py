@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import functools
+
+import plotly.graph_objects as go
+import plotly.io as pio
+from dash import Patch, ctx
+
+# Every figure embeds its whole template, and the default 'plotly' one is most of the payload.
+# This one keeps only the parts used by the bar, histogram and map charts of the app, plus the dark styling.
+TEMPLATE = 'blockbuster'
+TEMPLATE_TRACES = ['bar', 'histogram', 'scatter', 'choropleth', 'scattergeo']
+TEMPLATE_LAYOUT = ['autotypenumbers', 'colorway', 'hovermode', 'hoverlabel', 'coloraxis', 'xaxis', 'yaxis', 'geo', 'title', 'shapedefaults', 'annotationdefaults']
+
+# Trace properties that depend on the selected metric; everything else is kept from the figure on the page
+PATCH_TRACE_KEYS = ['x', 'y', 'z', 'text', 'locations', 'name', 'marker', 'colorbar']
+
+
+def build_template()->go.layout.Template:
+    base = pio.templates['plotly'].to_plotly_json()
+    layout = {key: base['layout'][key] for key in TEMPLATE_LAYOUT}
+    layout['colorscale'] = {'sequential': base['layout']['colorscale']['sequential']}
+    layout.update(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font={'color': '#9fa6b7'})
+    return go.layout.Template(data={trace: base['data'][trace] for trace in TEMPLATE_TRACES}, layout=layout)
+
+
+pio.templates[TEMPLATE] = build_template()
+pio.templates.default = TEMPLATE
+
+
+def trim(fig:go.Figure)->go.Figure:
+    # Points without a counterpart on the other axis are never drawn, so they are not sent either
+    for trace in fig.data:
+        x, y = getattr(trace, 'x', None), getattr(trace, 'y', None)
+        if x is not None and y is not None and len(x) != len(y):
+            size = min(len(x), len(y))
+            trace.update(x=x[:size], y=y[:size])
+    return fig
+
+
+def figure_json(fig:go.Figure)->str:
+    return trim(fig).to_json()
+
+
+def figure_patch(figure:dict)->Patch:
+    patch = Patch()
+    for position, trace in enumerate(figure['data']):
+        for key in PATCH_TRACE_KEYS:
+            if key in trace:
+                patch['data'][position][key] = trace[key]
+    for key, value in figure['layout'].items():
+        if key == 'title':
+            patch['layout']['title'] = value
+        elif key.startswith(('xaxis', 'yaxis')) and 'title' in value:
+            patch['layout'][key]['title'] = value['title']
+    return patch
+
+
+def patch_on(*input_ids):
+    # When only these inputs triggered the callback the figure keeps its traces and layout,
+    # so the browser gets a Patch of the data arrays and titles instead of the whole figure
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            figure = func(*args)
+            triggered = set(ctx.triggered_prop_ids.values())
+            if triggered and triggered <= set(input_ids):
+                return figure_patch(figure)
+            return figure
+        return wrapper
+    return decorator
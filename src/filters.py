@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from data import facts, on_reload
+from startup import phase
+from timing import timed
+
+FILTER_COLUMNS = ['FilmLanguageID', 'FilmDirectorID', 'FilmStudioID', 'FilmCountryID']
+# Columns of the ranking table, kept pre-sorted so that a page of any selection is found without sorting it
+SORT_COLUMNS = ['FilmName', 'FilmBoxOfficeDollars', 'FilmBudgetDollars', 'FilmOscarNominations', 'FilmOscarWins', 'FilmBenefits']
+
+# Packed bitmaps cost len(frame)/8 bytes per distinct value, so high-cardinality
+# columns above this budget get their bitmaps built on demand from the postings instead
+BITMAP_BUDGET_BYTES = 64 * 2**20
+
+
+def positions_dtype(size:int):
+    # Row positions are cached per selection, int32 takes half the memory of numpy's default int64
+    return np.int32 if size < 2**31 else np.int64
+
+
+class FilterIndex:
+
+    def __init__(self, df:pd.DataFrame):
+        self.size = len(df)
+        self.codes = {}
+        self.postings = {}
+        self.bitmaps = {}
+
+        for column in FILTER_COLUMNS:
+            codes, uniques = pd.factorize(df[column])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.codes[column] = {value: code for code, value in enumerate(uniques)}
+            self.postings[column] = (order, bounds)
+            if len(uniques) * (self.size // 8 + 1) <= BITMAP_BUDGET_BYTES:
+                self.bitmaps[column] = [self._pack(order[bounds[code]:bounds[code + 1]]) for code in range(len(uniques))]
+
+        dates = df['FilmReleaseDate'].to_numpy()
+        valid = np.flatnonzero(~np.isnat(dates))
+        self.date_order = valid[np.argsort(dates[valid], kind='stable')]
+        self.sorted_dates = dates[self.date_order]
+
+    def _pack(self, positions:np.ndarray)->np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return np.packbits(mask)
+
+    def bitmap(self, column:str, value)->np.ndarray:
+        code = self.codes[column].get(value)
+        if code is None:
+            return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        if column in self.bitmaps:
+            return self.bitmaps[column][code]
+        order, bounds = self.postings[column]
+        return self._pack(order[bounds[code]:bounds[code + 1]])
+
+    def date_bitmap(self, start_date, end_date)->np.ndarray:
+        lo, hi = 0, len(self.sorted_dates)
+        if start_date is not None:
+            lo = np.searchsorted(self.sorted_dates, pd.Timestamp(start_date).to_datetime64(), side='left')
+        if end_date is not None:
+            hi = np.searchsorted(self.sorted_dates, pd.Timestamp(end_date).to_datetime64(), side='right')
+        return self._pack(self.date_order[lo:hi])
+
+    @timed('filter')
+    def select(self, language, director, studio, country, start_date, end_date)->np.ndarray:
+        bits = self.date_bitmap(start_date, end_date)
+        for column, value in zip(FILTER_COLUMNS, [language, director, studio, country]):
+            if value != 'All':
+                bits = bits & self.bitmap(column, value)
+        return np.flatnonzero(np.unpackbits(bits, count=self.size)).astype(positions_dtype(self.size))
+
+
+class SortIndex:
+
+    def __init__(self, df:pd.DataFrame, columns:list):
+        self.size = len(df)
+        self.orders = {}
+        self.valid = {}
+        for column in columns:
+            values = df[column].reset_index(drop=True)
+            self.orders[column] = values.sort_values(kind='stable', na_position='last').index.to_numpy().astype(positions_dtype(self.size))
+            self.valid[column] = int(values.notna().sum())
+
+    def sort(self, positions:np.ndarray, column:str, ascending:bool=True)->np.ndarray:
+        # Walks the column order once and keeps the selected rows, missing values last either way
+        order, valid = self.orders[column], self.valid[column]
+        if not ascending:
+            order = np.concatenate([order[:valid][::-1], order[valid:]])
+        selected = np.zeros(self.size, dtype=bool)
+        selected[positions] = True
+        return order[selected[order]]
+
+
+indexes = {}
+sort_indexes = {}
+
+
+@on_reload
+def build_indexes():
+    with phase('filter indexes'):
+        indexes.clear()
+        indexes.update({name: FilterIndex(frame) for name, frame in facts.items()})
+        sort_indexes.clear()
+        sort_indexes['Film'] = SortIndex(facts['Film'], SORT_COLUMNS)
+
+
+build_indexes()
+
+
+@timed('filter')
+def filter_frame(name:str, language, director, studio, country, start_date, end_date)->pd.DataFrame:
+    return facts[name].take(indexes[name].select(language, director, studio, country, start_date, end_date))
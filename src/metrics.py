@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+
+
+def remove_directory(path:str, pid:int):
+    # Forked processes inherit the atexit hooks, only the one that made the directory removes it
+    if os.getpid() == pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    # Not started through gunicorn.conf.py, which clears its directory before the workers start:
+    # one of our own, inherited by the processes started from this one and removed at exit
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='blockbuster-metrics-')
+    atexit.register(remove_directory, os.environ['PROMETHEUS_MULTIPROC_DIR'], os.getpid())
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+import cache
+from data import frame_memory, load_info, on_reload, tables
+
+# Prometheus metrics served on /metrics. Every process writes its values to its own files in
+# PROMETHEUS_MULTIPROC_DIR and a scrape adds them up, so whichever gunicorn worker answers
+# reports the whole server. Per-callback CPU time shows which tab keeps the workers busy.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+callback_requests = Counter('blockbuster_callback_requests_total', 'Callback requests', ['output', 'status'])
+callback_seconds = Histogram('blockbuster_callback_seconds', 'Callback request latency', ['output'], buckets=BUCKETS)
+callback_phase_seconds = Histogram('blockbuster_callback_phase_seconds', 'Time per phase of a callback request, see timing.py', ['output', 'phase'], buckets=BUCKETS)
+callback_response_bytes = Histogram('blockbuster_callback_response_bytes', 'Size of the callback responses sent to the browser', ['output'], buckets=BYTE_BUCKETS)
+callback_cpu_seconds = Counter('blockbuster_callback_cpu_seconds_total', 'CPU time spent serving callback requests', ['output'])
+cache_requests = Counter('blockbuster_cache_requests_total', 'Cache lookups, the hit ratio is hit / (hit + miss)', ['cache', 'result'])
+table_bytes = Gauge('blockbuster_table_bytes', 'Memory of the loaded tables and facts', ['table'], multiprocess_mode='max')
+table_rows = Gauge('blockbuster_table_rows', 'Rows of the loaded tables', ['table'], multiprocess_mode='max')
+load_seconds = Gauge('blockbuster_data_load_seconds', 'Time taken to load the data', ['source'], multiprocess_mode='max')
+worker_rss = Gauge('blockbuster_worker_rss_bytes', 'Resident memory of each worker', multiprocess_mode='liveall')
+
+# Cache counts already added to cache_requests by this process
+reported = {}
+# Threaded workers record the caches of several requests at once
+reported_lock = threading.Lock()
+
+
+@on_reload
+def record_tables():
+    for name, size in frame_memory().items():
+        table_bytes.labels(name).set(size)
+    for name, df in tables.items():
+        table_rows.labels(f'table.{name}').set(len(df))
+    load_seconds.labels(load_info.get('source', '')).set(load_info.get('seconds', 0))
+
+
+record_tables()
+
+
+def rss()->int:
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+
+def record_caches():
+    # The caches count their own hits and misses, only what changed since the last call is added
+    counts = {(name, 'hit'): lru.hits for name, lru in cache.caches.items()}
+    counts.update({(name, 'miss'): lru.misses for name, lru in cache.caches.items()})
+    if cache.shared is not None:
+        counts.update({('shared', 'hit'): cache.shared.hits, ('shared', 'miss'): cache.shared.misses})
+    with reported_lock:
+        for key, count in counts.items():
+            if count > reported.get(key, 0):
+                cache_requests.labels(*key).inc(count - reported.get(key, 0))
+            reported[key] = count
+
+
+def record_callback(output:str, status:int, timings:dict):
+    callback_requests.labels(output, str(status)).inc()
+    callback_seconds.labels(output).observe(timings['total'])
+    callback_cpu_seconds.labels(output).inc(timings.get('cpu', 0.0))
+    for phase, seconds in timings.items():
+        if phase not in ('total', 'cpu'):
+            callback_phase_seconds.labels(output, phase).observe(seconds)
+    record_caches()
+    worker_rss.set(rss())
+
+
+def record_payload(output:str, size:int):
+    callback_response_bytes.labels(output).observe(size)
+
+
+def exposition()->tuple:
+    worker_rss.set(rss())
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,17 +1,13 @@
 import dash
 from dash import Dash, dcc, html, dash_table,callback
 from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
 from dash.dash_table.Format import Format, Symbol, Scheme
-import plotly.graph_objects as go
-import plotly.express  as px
-from plotly.subplots import make_subplots
 import pandas as pd
 
 #dash.register_page(__name__)
 
 from utils import generate_dropdown_option
-from data import tables
+from data import AGE_EDGES, tables
 
 
 def layout():
@@ -41,6 +37,22 @@ def layout():
                                 ),
                             ],
                         ),
+                        html.Div(
+                            id="age-edges-select-outer",
+                            className="control-row-2",
+                            children=[
+                                html.Label("Age categories"),
+                                dcc.RangeSlider(
+                                    id="age-edges-select",
+                                    min=5,
+                                    max=95,
+                                    step=5,
+                                    value=AGE_EDGES,
+                                    pushable=5,
+                                    marks={i: str(i) for i in range(10, 100, 10)},
+                                ),
+                            ],
+                        ),
                         html.Br(),
                         html.P(className='section-title', children="Filters"),
                         html.Div(
@@ -98,8 +110,10 @@ def layout():
                                 html.Div(
                                     children=[
                                         html.Label("Filter by date"),
+                                        dcc.Store(id="filters-ages"),
                                         dcc.DatePickerRange(
                                             id="date-select-ages",
+                                            updatemode="bothdates",
                                             start_date=tables['Film']['FilmReleaseDate'].min(),
                                             end_date=tables['Film']['FilmReleaseDate'].max()
                                         )
@@ -121,6 +135,7 @@ def layout():
                         html.Div(
                             id="table-ages",
                             children=[
+                                html.Progress(id="ages-progress", style={'visibility': 'hidden'}),
                                 dcc.Graph(id="ages-plot-1"),
                                 dcc.Graph(id="ages-plot-2")
                             ],
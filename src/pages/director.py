@@ -1,10 +1,7 @@
 import dash
 from dash import Dash, dcc, html, dash_table,callback
 from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
 from dash.dash_table.Format import Format, Symbol, Scheme
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 
 from utils import generate_dropdown_option
@@ -46,6 +43,14 @@ def layout():
                                         options=[{"label": i, "value": i} for i in ['Average','Total']],
                                         value='Average',
                                     )]),
+
+                                    html.Div(children=[
+                                    html.Label("Number of bars"),
+                                    dcc.Dropdown(
+                                        id="top-select-director",
+                                        options=[{"label": f"Top {i}", "value": i} for i in [10, 50, 100]],
+                                        value=10,
+                                    )]),
                             ],
                         ),
                         html.Br(),
@@ -105,8 +110,10 @@ def layout():
                                 html.Div(
                                     children=[
                                         html.Label("Filter by date"),
+                                        dcc.Store(id="filters-director"),
                                         dcc.DatePickerRange(
                                             id="date-select-director",
+                                            updatemode="bothdates",
                                             start_date=tables['Film']['FilmReleaseDate'].min(),
                                             end_date=tables['Film']['FilmReleaseDate'].max()
                                         )
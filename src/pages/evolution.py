@@ -1,10 +1,7 @@
 import dash
 from dash import Dash, dcc, html, dash_table,callback
 from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
 from dash.dash_table.Format import Format, Symbol, Scheme
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 
 from utils import generate_dropdown_option
@@ -96,8 +93,10 @@ def layout():
                                 html.Div(
                                     children=[
                                         html.Label("Filter by date"),
+                                        dcc.Store(id="filters-evolution"),
                                         dcc.DatePickerRange(
                                             id="date-select-evolution",
+                                            updatemode="bothdates",
                                             start_date=tables['Film']['FilmReleaseDate'].min(),
                                             end_date=tables['Film']['FilmReleaseDate'].max()
                                         )
@@ -115,6 +114,7 @@ def layout():
                             id="table-evolution",
                             children=[
                                 dcc.Graph(id="evolution-plot"),
+                                dcc.Store(id="evolution-store"),
                             ],
                         ),
                     ],
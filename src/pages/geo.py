@@ -1,10 +1,7 @@
 import dash
 from dash import Dash, dcc, html, dash_table,callback
 from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
 from dash.dash_table.Format import Format, Symbol, Scheme
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 
 from utils import generate_dropdown_option
@@ -96,8 +93,10 @@ def layout():
                                 html.Div(
                                     children=[
                                         html.Label("Filter by date"),
+                                        dcc.Store(id="filters-geo"),
                                         dcc.DatePickerRange(
                                             id="date-select-geo",
+                                            updatemode="bothdates",
                                             start_date=tables['Film']['FilmReleaseDate'].min(),
                                             end_date=tables['Film']['FilmReleaseDate'].max()
                                         )
@@ -116,6 +115,7 @@ def layout():
                             id="table-geo",
                             children=[
                                 html.Br(),
+                                html.Progress(id="geo-progress", style={'visibility': 'hidden'}),
                                 dcc.Graph(id="geo-plot"),
                             ],
                         ),
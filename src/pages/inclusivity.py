@@ -1,11 +1,7 @@
 import dash
 from dash import Dash, dcc, html, dash_table,callback
 from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
 from dash.dash_table.Format import Format, Symbol, Scheme
-import plotly.graph_objects as go
-import plotly.express  as px
-from plotly.subplots import make_subplots
 import pandas as pd
 
 #dash.register_page(__name__)
@@ -98,8 +94,10 @@ def layout():
                                 html.Div(
                                     children=[
                                         html.Label("Filter by date"),
+                                        dcc.Store(id="filters-inclusivity"),
                                         dcc.DatePickerRange(
                                             id="date-select-inclusivity",
+                                            updatemode="bothdates",
                                             start_date=tables['Film']['FilmReleaseDate'].min(),
                                             end_date=tables['Film']['FilmReleaseDate'].max()
                                         )
@@ -121,6 +119,7 @@ def layout():
                         html.Div(
                             id="table-inclusivity",
                             children=[
+                                html.Progress(id="inclusivity-progress", style={'visibility': 'hidden'}),
                                 dcc.Graph(id="inclusivity-plot-1"),
                                 dcc.Graph(id="inclusivity-plot-2")
                             ],
@@ -1,10 +1,7 @@
 import dash
 from dash import Dash, dcc, html, dash_table,callback
 from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
 from dash.dash_table.Format import Format, Symbol, Scheme
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 
 
 from utils import generate_dropdown_option
@@ -37,6 +34,12 @@ def layout():
                                     options=[{"label": i, "value": i} for i in ['BoxOfficeDollars', 'BudgetDollars', 'OscarNominations', 'OscarWins', 'Benefits']],
                                     value=['BoxOfficeDollars', 'BudgetDollars', 'OscarNominations', 'OscarWins', 'Benefits'][0],
                                 ),
+                                html.Label("Number of bars"),
+                                dcc.Dropdown(
+                                    id="top-select-ranking",
+                                    options=[{"label": f"Top {i}", "value": i} for i in [10, 50, 100]],
+                                    value=10,
+                                ),
                             ],
                         ),
                         html.Br(),
@@ -96,8 +99,10 @@ def layout():
                                 html.Div(
                                     children=[
                                         html.Label("Filter by date"),
+                                        dcc.Store(id="filters-ranking"),
                                         dcc.DatePickerRange(
                                             id="date-select-ranking",
+                                            updatemode="bothdates",
                                             start_date=tables['Film']['FilmReleaseDate'].min(),
                                             end_date=tables['Film']['FilmReleaseDate'].max()
                                         )
@@ -115,7 +120,27 @@ def layout():
                             id="table-ranking",
                             children=[
                                 html.P(id="ranking-table-title"),
-                                html.Div(id="ranking-container"),
+                                html.Div(id="ranking-container", children=[
+                                    # Paged, sorted and filtered on the server, which only sends the rows of the current page
+                                    dash_table.DataTable(
+                                        id="procedure-stats-table",
+                                        columns=[],
+                                        page_action="custom",
+                                        filter_action="custom",
+                                        sort_action="custom",
+                                        style_cell={
+                                            "textOverflow": "ellipsis",
+                                            "background-color": "#242a3b",
+                                            "color": "#7b7d8d",
+                                        },
+                                        sort_mode="multi",
+                                        sort_by=[],
+                                        filter_query="",
+                                        page_size=10,
+                                        style_header={"background-color": "#1f2536"},
+                                        page_current=0
+                                    ),
+                                ]),
                             ],
                         ),
                     ],
@@ -123,6 +148,7 @@ def layout():
             ]
         ),
 
-        html.Div(children=[dcc.Graph(id="figure-ranking")])
+        html.Div(children=[dcc.Graph(id="figure-ranking")]),
+        dcc.Store(id="ranking-store"),
     ])
 
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import collections
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import os
+import pathlib
+import pstats
+import sys
+import tempfile
+import threading
+import time
+
+from flask import g
+
+# Profiles single requests on demand. It is only set up when BLOCKBUSTER_PROFILE_TOKEN is set,
+# and then profiles the requests that carry the token in the X-Blockbuster-Profile header,
+# e.g. `X-Blockbuster-Profile: <token>` or `<token>:cprofile`. Never in the query string,
+# which access logs and browser history keep.
+#
+# A sampling thread records the stack of the request every SAMPLE_INTERVAL, or as often as it gets
+# the GIL (every 5 ms by default). The stacks are written collapsed, for flamegraph.pl or speedscope,
+# with a top-N summary of the frames the samples landed in.
+# `:cprofile` also runs cProfile, which counts every call but slows the request down; its stats
+# go to a .prof file and into the summary. The files are named after the time, the callback
+# output and a digest of the inputs, which are written in full at the top of the summary.
+
+TOKEN = os.environ.get('BLOCKBUSTER_PROFILE_TOKEN')
+ENABLED = bool(TOKEN)
+PROFILE_DIR = pathlib.Path(os.environ.get('BLOCKBUSTER_PROFILE_DIR', pathlib.Path(tempfile.gettempdir()) / 'blockbuster-profiles'))
+HEADER = 'X-Blockbuster-Profile'
+TOP = int(os.environ.get('BLOCKBUSTER_PROFILE_TOP', 30))
+SAMPLE_INTERVAL = 0.002
+
+
+class Sampler:
+
+    def __init__(self, thread_id:int, interval:float=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+def frame_name(code)->str:
+    return f'{code.co_name} ({pathlib.Path(code.co_filename).name}:{code.co_firstlineno})'
+
+
+def collapse(frame)->str:
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def requested(request)->str|None:
+    # The profiler asked for by the request, None when it does not carry the token
+    value = request.headers.get(HEADER)
+    if not value:
+        return None
+    token, _, mode = value.partition(':')
+    if not hmac.compare_digest(token.encode(), TOKEN.encode()):
+        return None
+    return 'cprofile' if mode == 'cprofile' else 'sample'
+
+
+def start(mode:str):
+    g.profile_sampler = Sampler(threading.get_ident())
+    g.profile_cprofile = cProfile.Profile() if mode == 'cprofile' else None
+    g.profile_started = time.perf_counter()
+    g.profile_sampler.start()
+    if g.profile_cprofile is not None:
+        g.profile_cprofile.enable()
+
+
+def top_frames(stacks:collections.Counter)->str:
+    # Samples in which each frame was running (self) and on the stack at all (total)
+    own, total = collections.Counter(), collections.Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    samples = sum(stacks.values()) or 1
+    lines = [f'{"self":>7}{"total":>8}  frame']
+    lines += [f'{own[frame] / samples:7.1%}{total[frame] / samples:8.1%}  {frame}' for frame, _ in own.most_common(TOP)]
+    return '\n'.join(lines)
+
+
+def finish(response, output:str|None, inputs:list)->str|None:
+    # Stops the profilers of the request and writes their files, returns the name they share;
+    # output is the id of the callback output, e.g. 'geo-plot'
+    if 'profile_sampler' not in g:
+        return None
+    if g.profile_cprofile is not None:
+        g.profile_cprofile.disable()
+    g.profile_sampler.stop()
+    elapsed = time.perf_counter() - g.profile_started
+
+    tag = ''.join(char if char.isalnum() or char in '-+' else '_' for char in output or 'request')
+    digest = hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:8]
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{tag}-{digest}'
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+
+    stacks = g.profile_sampler.stacks
+    (PROFILE_DIR / f'{name}.collapsed').write_text(''.join(f'{stack} {count}\n' for stack, count in stacks.items()))
+    summary = [
+        f'output: {output}',
+        f'inputs: {json.dumps(inputs, default=str)}',
+        f'status: {response.status_code}, {elapsed * 1000:.1f} ms, {sum(stacks.values())} samples',
+        '',
+        top_frames(stacks),
+    ]
+    if g.profile_cprofile is not None:
+        g.profile_cprofile.dump_stats(PROFILE_DIR / f'{name}.prof')
+        stream = io.StringIO()
+        pstats.Stats(g.profile_cprofile, stream=stream).sort_stats('cumulative').print_stats(TOP)
+        summary += ['', stream.getvalue()]
+    (PROFILE_DIR / f'{name}.txt').write_text('\n'.join(summary) + '\n')
+    return name
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import shutil
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 2
+
+
+# One directory per frame and one .npy file per column, so that a frame is loaded
+# without any parsing. Text columns are stored as integer codes plus their sorted distinct values,
+# categoricals as their codes plus their categories, and nullable integers as values plus a mask.
+# Read with mmap=True, numeric columns stay read-only views of the files, whose pages
+# are shared by every process that maps them.
+
+def write_frame(df:pd.DataFrame, directory:pathlib.Path)->dict:
+    directory.mkdir(parents=True)
+    np.save(directory / 'index.npy', df.index.to_numpy())
+    columns = []
+    for position, column in enumerate(df.columns):
+        values = df[column]
+        if values.dtype == object:
+            codes, uniques = pd.factorize(values, sort=True)
+            np.save(directory / f'c{position}.npy', codes.astype(np.int32))
+            np.save(directory / f'c{position}.values.npy', np.asarray(uniques).astype(str))
+            columns.append([column, 'text'])
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            categories = np.asarray(values.cat.categories)
+            np.save(directory / f'c{position}.npy', values.cat.codes.to_numpy())
+            np.save(directory / f'c{position}.values.npy', categories.astype(str) if categories.dtype == object else categories)
+            columns.append([column, 'ordered' if values.cat.ordered else 'category'])
+        elif isinstance(values.array, pd.arrays.IntegerArray):
+            np.save(directory / f'c{position}.npy', values.to_numpy(values.dtype.numpy_dtype, na_value=0))
+            np.save(directory / f'c{position}.mask.npy', values.isna().to_numpy())
+            columns.append([column, 'masked'])
+        else:
+            np.save(directory / f'c{position}.npy', values.to_numpy())
+            columns.append([column, 'array'])
+    return {'index': df.index.name, 'columns': columns}
+
+
+def read_frame(directory:pathlib.Path, layout:dict, skip:list=(), categorical:bool=False, mmap:bool=False)->pd.DataFrame:
+    # With categorical=True text columns stay as codes instead of being expanded to Python strings
+    data = {}
+    for position, (column, kind) in enumerate(layout['columns']):
+        if column in skip:
+            continue
+        values = np.load(directory / f'c{position}.npy', mmap_mode='r' if mmap else None)
+        if kind in ('text', 'category', 'ordered'):
+            codes = values
+            categories = np.load(directory / f'c{position}.values.npy')
+            if categories.dtype.kind == 'U':
+                categories = categories.astype(object)
+            if categorical or kind != 'text':
+                values = pd.Categorical.from_codes(codes, categories, ordered=kind == 'ordered')
+            else:
+                values = categories[codes]
+                values[codes == -1] = np.nan
+        elif kind == 'masked':
+            values = pd.arrays.IntegerArray(values, np.load(directory / f'c{position}.mask.npy', mmap_mode='r' if mmap else None))
+        data[column] = values
+    index = pd.Index(np.load(directory / 'index.npy', mmap_mode='r' if mmap else None), name=layout['index'])
+    # copy=False keeps one block per column instead of consolidating them into new arrays
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def write(directory:pathlib.Path, frames:dict, fingerprint:str):
+    # Written next to the final location and swapped in, so a running app never reads half a snapshot
+    directory = pathlib.Path(directory)
+    staging = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    manifest = {'format': FORMAT_VERSION, 'fingerprint': fingerprint, 'frames': {}}
+    for name, df in frames.items():
+        manifest['frames'][name] = write_frame(df, staging / name)
+    (staging / 'manifest.json').write_text(json.dumps(manifest, indent=1))
+
+    shutil.rmtree(directory, ignore_errors=True)
+    staging.rename(directory)
+
+
+def read(directory:pathlib.Path, fingerprint:str, skip:list=(), categorical:bool=False, mmap:bool=False)->dict|None:
+    # Returns None when the snapshot is missing or was built from other CSVs
+    directory = pathlib.Path(directory)
+    try:
+        manifest = json.loads((directory / 'manifest.json').read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifest.get('format') != FORMAT_VERSION or manifest.get('fingerprint') != fingerprint:
+        return None
+    return {name: read_frame(directory / name, layout, skip, categorical, mmap) for name, layout in manifest['frames'].items()}
+
+
+if __name__ == '__main__':
+    from data import COMPACT, DATA_DIR, SNAPSHOT_DIR, build_facts, compact, csv_fingerprint, read_csv_tables, snapshot_key
+
+    tables = read_csv_tables(DATA_DIR)
+    facts = build_facts(tables)
+    frames = {**tables, **{f'fact.{name}': df for name, df in facts.items() if name != 'Film'}}
+    if COMPACT:
+        # Stored with the compact dtypes already, so that loading does not have to convert (and copy) them
+        frames = {name: compact(df) for name, df in frames.items()}
+    write(SNAPSHOT_DIR, frames, snapshot_key(csv_fingerprint(DATA_DIR)))
+    print(f'Snapshot of {len(frames)} frames written to {SNAPSHOT_DIR}')
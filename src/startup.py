@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+started = time.perf_counter()
+phases = {}
+
+
+@contextmanager
+def phase(name:str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - start
+
+
+def report()->str:
+    lines = ['Startup timings:']
+    lines += [f'  {name:<24}{seconds * 1000:9.1f} ms' for name, seconds in phases.items()]
+    lines.append(f'  {"total":<24}{(time.perf_counter() - started) * 1000:9.1f} ms')
+    return '\n'.join(lines)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import pathlib
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Writes a synthetic catalog in the layout of src/data/tbl*.csv, as large as needed for load tests.
+# The shape is learned from the bundled tables: cast size per film, films per director and per
+# studio, appearances per actor, release dates, budget and box office (resampled together with
+# log-normal noise), and the missing values of each column. Films and their cast are generated
+# and appended chunk by chunk; only a few bytes per film and per person are kept across chunks.
+#
+#   python src/synthetic.py /tmp/catalog --films 2000000
+#   BLOCKBUSTER_DATA_DIR=/tmp/catalog python src/snapshot.py
+#
+# The snapshot is then built from the CSVs like for the bundled data; it has to load every table.
+
+DATA_DIR = pathlib.Path(__file__).resolve().parent / 'data'
+# Referenced by ID only and small whatever the catalog size, so they are copied as they are
+COPIED = ['Certificate', 'Country', 'Language']
+# Film columns sampled together from the same bundled film, which keeps e.g. nominations and wins consistent
+FILM_ATTRIBUTES = ['FilmLanguageID', 'FilmCountryID', 'FilmSynopsis', 'FilmRunTimeMinutes', 'FilmCertificateID', 'FilmOscarNominations', 'FilmOscarWins']
+DATE_JITTER_DAYS = 365
+# Standard deviation of the log-normal noise put on resampled budgets and box offices
+MONEY_NOISE = 0.25
+
+
+class Profile:
+
+    def __init__(self, data_dir:pathlib.Path):
+        films = pd.read_csv(data_dir / 'tblFilm.csv')
+        cast = pd.read_csv(data_dir / 'tblCast.csv')
+        self.films = films
+        self.actors = pd.read_csv(data_dir / 'tblActor.csv')
+        self.directors = pd.read_csv(data_dir / 'tblDirector.csv')
+        self.character_names = cast['CastCharacterName'].dropna().to_numpy()
+
+        self.cast_sizes = cast.groupby('CastFilmID').size().reindex(films['FilmID'], fill_value=0).to_numpy()
+        self.films_per_director = films.groupby('FilmDirectorID').size().to_numpy()
+        self.films_per_studio = films.groupby('FilmStudioID').size().to_numpy()
+        self.appearances_per_actor = cast.groupby('CastActorID').size().to_numpy()
+        self.missing = films.isna().mean()
+
+        dates = pd.to_datetime(films['FilmReleaseDate']).dropna()
+        self.release_days = (dates - pd.Timestamp('1970-01-01')).dt.days.to_numpy()
+        self.money = films[['FilmBudgetDollars', 'FilmBoxOfficeDollars']].to_numpy()
+
+
+class Slots:
+    # Hands out the IDs of generated people or studios so that each is used exactly as many times
+    # as a count drawn from the bundled ones, which keeps the skew (e.g. a few studios with most films)
+
+    def __init__(self, counts:np.ndarray, total:int, rng:np.random.Generator):
+        ends = np.cumsum(rng.choice(counts, int(total / counts.mean() * 1.1) + 10))
+        while ends[-1] < total:
+            ends = np.concatenate([ends, ends[-1] + np.cumsum(rng.choice(counts, len(ends)))])
+        # Just enough of them for `total` uses, the last one gets what is left
+        self.ends = ends[:np.searchsorted(ends, total) + 1]
+        self.ends[-1] = total
+        self.used = 0
+
+    def __len__(self):
+        return len(self.ends)
+
+    def take(self, size:int, rng:np.random.Generator)->np.ndarray:
+        positions = np.arange(self.used, self.used + size)
+        self.used += size
+        return rng.permutation(np.searchsorted(self.ends, positions, side='right') + 1)
+
+
+def with_missing(values:pd.Series, rate:float, rng:np.random.Generator)->pd.Series:
+    return values.mask(rng.random(len(values)) < rate)
+
+
+def write_chunk(df:pd.DataFrame, path:pathlib.Path, first:bool):
+    df.to_csv(path, mode='w' if first else 'a', header=first, index=False, quoting=csv.QUOTE_NONNUMERIC)
+
+
+def people(name:str, source:pd.DataFrame, size:int, path:pathlib.Path, chunk:int, rng:np.random.Generator):
+    for start in range(0, size, chunk):
+        ids = np.arange(start + 1, min(start + chunk, size) + 1)
+        sample = source.sample(len(ids), replace=True, random_state=rng).reset_index(drop=True)
+        write_chunk(pd.DataFrame({
+            f'{name}ID': ids,
+            f'{name}Name': [f'{name} {id}' for id in ids],
+            f'{name}DOB': sample[f'{name}DOB'],
+            f'{name}Gender': sample[f'{name}Gender'],
+        }), path, start == 0)
+
+
+def films(profile:Profile, count:int, cast_sizes:np.ndarray, slots:dict, output:pathlib.Path, chunk:int, rng:np.random.Generator):
+    missing = profile.missing
+    cast_id = 0
+
+    for start in range(0, count, chunk):
+        ids = np.arange(start + 1, min(start + chunk, count) + 1)
+        size = len(ids)
+        sample = profile.films[FILM_ATTRIBUTES].sample(size, replace=True, random_state=rng).reset_index(drop=True)
+        days = rng.choice(profile.release_days, size) + rng.integers(-DATE_JITTER_DAYS, DATE_JITTER_DAYS + 1, size)
+        money = (profile.money[rng.integers(len(profile.money), size=size)] * np.exp(rng.normal(0, MONEY_NOISE, (size, 2)))).round(-3)
+
+        film = pd.DataFrame({
+            'FilmID': ids,
+            'FilmName': [f'Film {id}' for id in ids],
+            'FilmReleaseDate': with_missing(pd.Series(pd.Timestamp('1970-01-01') + pd.to_timedelta(days, 'D')).dt.strftime('%Y-%m-%d 00:00:00.000'), missing['FilmReleaseDate'], rng),
+            'FilmDirectorID': with_missing(pd.Series(slots['Director'].take(size, rng)), missing['FilmDirectorID'], rng).astype('Int64'),
+            'FilmLanguageID': sample['FilmLanguageID'].astype('Int64'),
+            'FilmCountryID': sample['FilmCountryID'].astype('Int64'),
+            'FilmStudioID': with_missing(pd.Series(slots['Studio'].take(size, rng)), missing['FilmStudioID'], rng).astype('Int64'),
+            'FilmSynopsis': sample['FilmSynopsis'],
+            'FilmRunTimeMinutes': sample['FilmRunTimeMinutes'].astype('Int64'),
+            'FilmCertificateID': sample['FilmCertificateID'].astype('Int64'),
+            'FilmBudgetDollars': pd.Series(money[:, 0]).astype('Int64'),
+            'FilmBoxOfficeDollars': pd.Series(money[:, 1]).astype('Int64'),
+            'FilmOscarNominations': sample['FilmOscarNominations'].astype('Int64'),
+            'FilmOscarWins': sample['FilmOscarWins'].astype('Int64'),
+        })
+        write_chunk(film, output / 'tblFilm.csv', start == 0)
+
+        sizes = cast_sizes[start:start + size]
+        total = int(sizes.sum())
+        write_chunk(pd.DataFrame({
+            'CastID': np.arange(cast_id + 1, cast_id + total + 1),
+            'CastFilmID': np.repeat(ids, sizes),
+            'CastActorID': slots['Actor'].take(total, rng),
+            'CastCharacterName': rng.choice(profile.character_names, total),
+        }), output / 'tblCast.csv', start == 0)
+        cast_id += total
+        print(f'{ids[-1]} films, {cast_id} cast rows')
+
+
+def generate(output:pathlib.Path, count:int, chunk:int, seed:int, data_dir:pathlib.Path=DATA_DIR):
+    output.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    profile = Profile(data_dir)
+    cast_sizes = rng.choice(profile.cast_sizes, count).astype(np.uint8)
+    slots = {
+        'Director': Slots(profile.films_per_director, count, rng),
+        'Studio': Slots(profile.films_per_studio, count, rng),
+        'Actor': Slots(profile.appearances_per_actor, int(cast_sizes.sum()), rng),
+    }
+
+    for name in COPIED:
+        shutil.copyfile(data_dir / f'tbl{name}.csv', output / f'tbl{name}.csv')
+    studios = np.arange(1, len(slots['Studio']) + 1)
+    write_chunk(pd.DataFrame({'StudioID': studios, 'StudioName': [f'Studio {id}' for id in studios]}), output / 'tblStudio.csv', True)
+    people('Director', profile.directors, len(slots['Director']), output / 'tblDirector.csv', chunk, rng)
+    people('Actor', profile.actors, len(slots['Actor']), output / 'tblActor.csv', chunk, rng)
+    films(profile, count, cast_sizes, slots, output, chunk, rng)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output', type=pathlib.Path)
+    parser.add_argument('--films', type=int, default=1_000_000)
+    parser.add_argument('--chunk', type=int, default=100_000, help='films generated and written at a time')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.output, args.films, args.chunk, args.seed)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import concurrent.futures
+import datetime
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+from worker_memory import PORT, ROOT, wait_for_workers
+
+# Starts gunicorn in each serving mode of gunicorn.conf.py and fires the same mix of callback
+# requests at it from concurrent clients, then prints the throughput and the latencies.
+# The filter dates change on every request so that the results caches never answer.
+# Meanwhile one more client keeps loading the page layout, a cheap request that shows
+# how long a user waits behind the slow callbacks of others.
+#
+#   python src/throughput.py [requests] [clients]
+
+MODES = {
+    'sync': 'app:server',
+    'gthread': 'app:server',
+    'gevent': 'app:server',
+    'asgi': 'asgi:app',
+}
+WORKERS = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+
+def filters(i:int)->dict:
+    start = datetime.date(1980, 1, 1) + datetime.timedelta(days=i)
+    return {'filters': ['All', 'All', 'All', 'All', start.isoformat(), '2020-12-31']}
+
+
+def bodies(i:int)->list:
+    def body(outputs:list, inputs:list)->dict:
+        specs = [{'id': output.split('.')[0], 'property': output.split('.')[1]} for output in outputs]
+        return {
+            'output': outputs[0] if len(outputs) == 1 else '..' + '...'.join(outputs) + '..',
+            'outputs': specs[0] if len(specs) == 1 else specs,
+            'inputs': [{'id': id, 'property': property, 'value': value} for id, property, value in inputs],
+            'changedPropIds': [f'{id}.{property}' for id, property, _ in inputs],
+            'state': [],
+        }
+
+    return [
+        body(['actor-plot.figure'], [('metric-select-actor', 'value', 'BoxOfficeDollars'), ('metric-select-actor-2', 'value', 'Average'), ('top-select-actor', 'value', 10), ('filters-actor', 'data', filters(i))]),
+        body(['inclusivity-plot-1.figure', 'inclusivity-plot-2.figure', 'inclusivity-plot-3.figure'], [('metric-select-inclusivity', 'value', 'Actor'), ('filters-inclusivity', 'data', filters(i))]),
+        body(['ages-plot-1.figure', 'ages-plot-2.figure', 'ages-plot-3.figure'], [('metric-select-ages', 'value', 'Actor'), ('age-edges-select', 'value', [20, 40, 60]), ('filters-ages', 'data', filters(i))]),
+        body(['geo-plot.figure'], [('metric-select-geo', 'value', 'BoxOfficeDollars'), ('filters-geo', 'data', filters(i))]),
+    ]
+
+
+def post(body:dict)->float:
+    started = time.perf_counter()
+    request = urllib.request.Request(f'http://127.0.0.1:{PORT}/_dash-update-component', data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    urllib.request.urlopen(request, timeout=120).read()
+    return time.perf_counter() - started
+
+
+def load_layout(done:concurrent.futures.Future)->list:
+    latencies = []
+    while not done.done():
+        started = time.perf_counter()
+        urllib.request.urlopen(f'http://127.0.0.1:{PORT}/_dash-layout', timeout=120).read()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def measure(mode:str, count:int, clients:int)->dict:
+    env = dict(os.environ, WEB_CONCURRENCY=str(WORKERS), BLOCKBUSTER_WORKER_CLASS=mode)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--chdir', 'src', '--bind', f'127.0.0.1:{PORT}', MODES[mode]],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_workers(process.pid, WORKERS)
+        requests = [body for i in range(count) for body in bodies(i)][:count]
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(clients + 1) as executor:
+            done = concurrent.futures.Future()
+            layouts = executor.submit(load_layout, done)
+            latencies = list(executor.map(post, requests))
+            elapsed = time.perf_counter() - started
+            done.set_result(None)
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50': np.percentile(latencies, 50) * 1000,
+            'p95': np.percentile(latencies, 95) * 1000,
+            'layout p95': np.percentile(layouts.result(), 95) * 1000,
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print(f'{WORKERS} workers, {count} requests from {clients} clients')
+    print(f'{"mode":>8}{"req/s":>10}{"p50":>12}{"p95":>12}{"layout p95":>14}')
+    for mode in MODES:
+        result = measure(mode, count, clients)
+        print(f'{mode:>8}{result["throughput"]:>10.1f}{result["p50"]:>9.0f} ms{result["p95"]:>9.0f} ms{result["layout p95"]:>11.0f} ms')
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+# Time spent in each phase of a callback request. Every _dash-update-component response gets a
+# Server-Timing header with them, which the browser shows in the network panel, and they are kept
+# in a rolling histogram per output (the last BLOCKBUSTER_TIMING_WINDOW requests), served on /timings.
+#
+#   filter     selecting the rows of the filters from the indexes
+#   groupby    the aggregates behind the figures, including merging them
+#   figure     building the Plotly figures
+#   serialize  figure JSON, and the response JSON: from the callback's return (mark_return)
+#              to the response, while Dash serializes the outputs
+#   cache      looking results up in the caches
+#   other      everything else, from parsing the request to Dash's own dispatch
+#   cpu        CPU time of the request's thread, overlapping the phases above
+#
+# The facts are merged once at load time, so no request spends time merging the raw tables.
+
+WINDOW = int(os.environ.get('BLOCKBUSTER_TIMING_WINDOW', 1000))
+
+
+class RollingHistogram:
+
+    def __init__(self, window:int=WINDOW):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, timings:dict):
+        with self._lock:
+            self.samples.append(timings)
+
+    def values(self, phase:str)->list:
+        with self._lock:
+            return sorted(sample.get(phase, 0.0) for sample in self.samples)
+
+    def percentile(self, phase:str, q:float)->float:
+        values = self.values(phase)
+        return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+
+histograms = {}
+histograms_lock = threading.Lock()
+
+
+@contextmanager
+def timed(name:str):
+    # Counts the time of a nested phase in that phase only, so the phases add up to the request;
+    # outside a request, e.g. in a background job, it does nothing
+    if not has_request_context() or 'timings' not in g:
+        yield
+        return
+    g.timing_stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = g.timing_stack.pop()
+        g.timings[name] = g.timings.get(name, 0.0) + elapsed - nested
+        if g.timing_stack:
+            g.timing_stack[-1] += elapsed
+
+
+def mark_return(func):
+    # Goes right under @app.callback; without it the response JSON is counted in 'other'
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if has_request_context() and 'timings' in g:
+                g.timing_returned = time.perf_counter()
+    return wrapper
+
+
+def start():
+    g.timings = {}
+    g.timing_stack = []
+    g.timing_started = time.perf_counter()
+    g.timing_cpu = time.thread_time()
+
+
+def output_id(output:str)->str:
+    # 'actor-plot.figure' -> 'actor-plot', '..ages-plot-1.figure...ages-plot-2.figure..' -> 'ages-plot-1+ages-plot-2'
+    return '+'.join(part.rsplit('.', 1)[0] for part in output.strip('.').split('...'))
+
+
+def finish(response, output:str|None)->dict|None:
+    # Adds the Server-Timing header and returns the timings, with the CPU time of the request
+    if 'timings' not in g:
+        return None
+    now = time.perf_counter()
+    if 'timing_returned' in g:
+        g.timings['serialize'] = g.timings.get('serialize', 0.0) + now - g.timing_returned
+    timings = dict(g.timings)
+    timings['total'] = now - g.timing_started
+    timings['other'] = max(0.0, timings['total'] - sum(g.timings.values()))
+    timings['cpu'] = time.thread_time() - g.timing_cpu
+    response.headers['Server-Timing'] = ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+
+    if output:
+        name = output_id(output)
+        with histograms_lock:
+            histogram = histograms.setdefault(name, RollingHistogram())
+        histogram.add(timings)
+    return timings
+
+
+def timing_report()->str:
+    lines = ['Callback timings (p50 / p95 ms):']
+    with histograms_lock:
+        items = sorted(histograms.items())
+    for name, histogram in items:
+        with histogram._lock:
+            phases = sorted({phase for sample in histogram.samples for phase in sample})
+        summary = ', '.join(f'{phase} {histogram.percentile(phase, 50) * 1000:.1f} / {histogram.percentile(phase, 95) * 1000:.1f}' for phase in phases)
+        lines.append(f'  {name:<60}{len(histogram.samples):6d} x  {summary}')
+    return '\n'.join(lines)
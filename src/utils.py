@@ -1,5 +1,12 @@
 from __future__ import annotations
 
+import importlib
+import re
+
+import numpy as np
+import pandas as pd
+
+
 def generate_dropdown_option(options:list|dict, all:bool=False)->list[dict]:
     
     if type(options) is list :
@@ -14,4 +21,52 @@ def generate_dropdown_option(options:list|dict, all:bool=False)->list[dict]:
     if all == True:
         dict_options.append({"label": "All", "value": "All"})
 
-    return dict_options
\ No newline at end of file
+    return dict_options
+
+class LazyModule:
+    # Stands in for a module and only imports it when one of its attributes is first used
+
+    def __init__(self, name:str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute:str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+def lazy_import(name:str)->LazyModule:
+    return LazyModule(name)
+
+
+# One clause of a DataTable filter_query, e.g. '{FilmName} icontains "star"' or '{FilmOscarWins} >= 2'
+FILTER_CLAUSE = re.compile(r'^\{(?P<column>[^}]+)\}\s*(?:(?P<case>[is]?)(?P<word>contains|datestartswith|eq|ne|lt|le|gt|ge)\b|(?P<symbol>>=|<=|!=|=|<|>))\s*(?P<value>.*)$')
+FILTER_OPERATORS = {'=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+
+
+def filter_query_mask(df:pd.DataFrame, query:str)->np.ndarray:
+    # Rows of df matching a DataTable filter_query; clauses that cannot be parsed are ignored
+    mask = np.ones(len(df), dtype=bool)
+    for clause in (query or '').split(' && '):
+        match = FILTER_CLAUSE.match(clause.strip())
+        if match is None or match['column'] not in df.columns:
+            continue
+        operator = match['word'] or FILTER_OPERATORS[match['symbol']]
+        value = match['value'].strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+
+        values = df[match['column']]
+        if operator == 'contains':
+            mask &= values.astype(str).str.contains(value, case=match['case'] != 'i', regex=False).to_numpy()
+        elif operator == 'datestartswith':
+            mask &= values.astype(str).str.startswith(value).to_numpy()
+        elif pd.api.types.is_numeric_dtype(values):
+            try:
+                mask &= getattr(values, operator)(float(value)).to_numpy()
+            except ValueError:
+                continue
+        else:
+            mask &= getattr(values.astype(str), operator)(value).to_numpy()
+    return mask
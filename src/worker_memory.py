@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Starts gunicorn with the repo config for each worker count, with and without preload,
+# sends each worker a request and prints the PSS and private memory of the whole process tree.
+# PSS splits every shared page between the processes mapping it, so summed over the
+# tree it is the memory the deployment actually costs.
+#
+#   python src/worker_memory.py 1 4 16
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+PORT = int(os.environ.get('PORT', 8050))
+
+
+def smaps_rollup(pid:int)->dict:
+    fields = {}
+    for line in pathlib.Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines()[1:]:
+        name, value = line.split(':')
+        fields[name] = int(value.split()[0]) * 1024
+    return fields
+
+
+def children(pid:int)->list:
+    path = pathlib.Path(f'/proc/{pid}/task/{pid}/children')
+    return [int(child) for child in path.read_text().split()]
+
+
+def wait_for_workers(master:int, count:int, timeout:float=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(children(master)) == count:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{PORT}/_dash-layout', timeout=5).read()
+                return
+            except OSError:
+                pass
+        time.sleep(0.5)
+    raise TimeoutError(f'gunicorn did not start {count} workers')
+
+
+def measure(workers:int, preload:bool)->dict:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BLOCKBUSTER_PRELOAD='1' if preload else '0')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--chdir', 'src', '--bind', f'127.0.0.1:{PORT}', 'app:server'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_workers(process.pid, workers)
+        # Enough requests for every worker to have served a few
+        for _ in range(workers * 4):
+            urllib.request.urlopen(f'http://127.0.0.1:{PORT}/', timeout=30).read()
+        time.sleep(1)
+        pids = [process.pid] + children(process.pid)
+        rollups = [smaps_rollup(pid) for pid in pids]
+        return {
+            'pss': sum(rollup['Pss'] for rollup in rollups),
+            'private': sum(rollup['Private_Clean'] + rollup['Private_Dirty'] for rollup in rollups),
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [1, 4, 16]
+    print(f'{"workers":>8}{"preload PSS":>14}{"private":>10}{"no preload PSS":>17}{"private":>10}')
+    for count in counts:
+        preloaded, separate = measure(count, True), measure(count, False)
+        print(f'{count:>8}{preloaded["pss"] / 2**20:>10.0f} MiB{preloaded["private"] / 2**20:>6.0f} MiB'
+              f'{separate["pss"] / 2**20:>13.0f} MiB{separate["private"] / 2**20:>6.0f} MiB')